@@ -49,11 +49,45 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'oauth2_provider.contrib.rest_framework.OAuth2Authentication',)
+        'courses.authentication.CachingOAuth2Authentication',)
 }
 
+# Cache access token đã xác thực (courses/authentication.py): số token tối đa và thời gian sống (giây)
+COURSES_TOKEN_CACHE_SIZE = 1000
+COURSES_TOKEN_CACHE_TTL = 60
+
+# Phát hiện N+1/truy vấn chậm theo request (courses/querydetector.py), tắt mặc định.
+# STRICT = True thì raise RepeatedQueryError thay vì ghi log (dùng khi chạy test).
+COURSES_QUERY_DETECTOR = False
+COURSES_QUERY_DETECTOR_THRESHOLD = 5
+COURSES_QUERY_DETECTOR_STRICT = False
+COURSES_QUERY_DETECTOR_SLOW_SECONDS = 0.5
+
 CKEDITOR_UPLOAD_PATH = "ckeditor/images"
 
+# Cache cho danh mục dịch vụ và dịch vụ theo hóa đơn (courses/cache.py).
+# Mặc định dùng bộ nhớ cục bộ; đổi BACKEND (vd. Redis/Memcached) hoặc COURSES_CACHE_ALIAS khi cần.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'btl_hiendai',
+    }
+}
+
+COURSES_CACHE_ALIAS = 'default'
+COURSES_CACHE_TIMEOUT = 60 * 60
+
+# Broker cho thông báo SSE /events/packages/ (courses/notifications.py)
+COURSES_NOTIFICATION_BROKER = 'courses.notifications.InProcessBroker'
+
+# Tải ảnh lên Cloudinary ở worker nền (courses/uploads.py).
+# WORKERS = 0 thì tải lên ngay trong request; test dùng 'courses.uploads.FakeUploadBackend'.
+COURSES_UPLOAD_BACKEND = 'courses.uploads.CloudinaryUploadBackend'
+COURSES_UPLOAD_SPOOL_DIR = BASE_DIR / 'upload_spool'
+COURSES_UPLOAD_WORKERS = 2
+COURSES_UPLOAD_MAX_ATTEMPTS = 3
+COURSES_UPLOAD_RETRY_DELAY = 1
+
 AUTH_USER_MODEL = 'courses.User'
 
 MEDIA_ROOT = '%s/courses/static/' % BASE_DIR
@@ -67,6 +101,10 @@ cloudinary.config(
 )
 
 MIDDLEWARE = [
+    # Đặt đầu tiên để đo toàn bộ thời gian xử lý; số liệu xem tại /metrics (courses/metrics.py)
+    'courses.metrics.MetricsMiddleware',
+    # Chỉ chạy khi COURSES_QUERY_DETECTOR = True (courses/querydetector.py)
+    'courses.querydetector.QueryDetectorMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
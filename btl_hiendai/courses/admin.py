@@ -2,12 +2,12 @@ from django.contrib import admin
 from django.template.response import TemplateResponse
 
 from .models import User, Service, Bill, Payment, ResidentFamily, AccessCard, Apartment, Contract, TuDo, Package, Feedback, SurveyForm, \
-    SurveyQuestion, SurveyResponse
+    SurveyQuestion, SurveyResponse, RevenueRollup
 from django import forms
 from ckeditor_uploader.widgets import CKEditorUploadingWidget
 from django.utils.html import mark_safe
 from django.urls import path
-from django.db.models import Count, Sum
+from .stats import payment_stats
 
 
 class MyCourseAdminSite(admin.AdminSite):
@@ -19,12 +19,11 @@ class MyCourseAdminSite(admin.AdminSite):
         ] + super().get_urls()
 
     def course_stats(self, request):
-        total_paid_invoices = Payment.objects.filter(status='pass').aggregate(total_paid=Count('id'))['total_paid']
-        course_stats = Payment.objects.select_related('bill').prefetch_related('bill__service').all()
+        total_paid_invoices = Payment.objects.filter(status='pass').count()
 
         return TemplateResponse(request, 'admin/stats.html', {
             'total_paid_invoices': total_paid_invoices,
-            'course_stats': course_stats
+            'stats': payment_stats()
         })
 
 
@@ -33,12 +32,12 @@ admin_site = MyCourseAdminSite(name='MyAdmin')
 
 class MyUserSite(admin.ModelAdmin):
     list_display = ['id', 'first_name', 'last_name', 'email', 'username', 'password', 'avatar', 'role']
-    search_fields = ['username', 'description']
+    search_fields = ['username', 'first_name', 'last_name', 'email']
 
 
 class MyServiceSite(admin.ModelAdmin):
     list_display = ['id', 'name', 'priceService']
-    search_fields = ['name', 'description']
+    search_fields = ['name', 'nameService']
 
 
 admin_site.register(User, MyUserSite)
@@ -55,5 +54,6 @@ admin_site.register(Feedback)
 admin_site.register(SurveyForm)
 admin_site.register(SurveyQuestion)
 admin_site.register(SurveyResponse)
+admin_site.register(RevenueRollup)
 
 
@@ -0,0 +1,102 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.utils.urls import replace_query_param
+
+from . import paginators
+from .views import PackageViewSet, PaymentViewSet, TuDoViewSet, authenticate_request
+
+# Bản async (ASGI) của các endpoint đọc nhiều nhất, dùng async ORM (aget, async for).
+# Lọc dữ liệu dùng lại get_queryset của viewset tương ứng nên kết quả giống bản đồng bộ.
+
+
+def build_view(viewset_class, request, user=None):
+    drf_request = Request(request)
+    if user is not None:
+        drf_request.user = user
+    return viewset_class(request=drf_request, action='list', kwargs={}, format_kwarg=None)
+
+
+def build_queryset(view):
+    # filter_queryset áp dụng cả ?fields=/?exclude= (.only()/.defer())
+    return view.filter_queryset(view.get_queryset())
+
+
+def get_page_size(request):
+    try:
+        size = int(request.GET.get('page_size', paginators.KeysetPaginator.page_size))
+    except ValueError:
+        size = paginators.KeysetPaginator.page_size
+    return max(1, min(size, paginators.KeysetPaginator.max_page_size))
+
+
+def validation_error(e):
+    return JsonResponse(e.detail, status=status.HTTP_400_BAD_REQUEST, safe=False)
+
+
+async def paginated_list(request, view, descending=True):
+    # Phân trang keyset theo id: ?cursor=<id cuối của trang trước>
+    try:
+        queryset = build_queryset(view)
+    except ValidationError as e:
+        return validation_error(e)
+    page_size = get_page_size(request)
+    cursor = request.GET.get('cursor')
+    if cursor and cursor.isdigit():
+        queryset = queryset.filter(pk__lt=cursor) if descending else queryset.filter(pk__gt=cursor)
+    queryset = queryset.order_by('-pk' if descending else 'pk')
+
+    objects = [obj async for obj in queryset[:page_size + 1]]
+    next_url = None
+    if len(objects) > page_size:
+        objects = objects[:page_size]
+        next_url = replace_query_param(request.build_absolute_uri(), 'cursor', objects[-1].pk)
+    return JsonResponse({'next': next_url, 'results': view.get_serializer(objects, many=True).data})
+
+
+async def retrieve(view, pk):
+    try:
+        queryset = build_queryset(view)
+    except ValidationError as e:
+        return validation_error(e)
+    try:
+        obj = await queryset.aget(pk=pk)
+    except queryset.model.DoesNotExist:
+        return JsonResponse({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+    return JsonResponse(view.get_serializer(obj).data)
+
+
+async def get_user_or_401(request):
+    user = await sync_to_async(authenticate_request)(request)
+    if user is None:
+        return None, JsonResponse({'detail': 'Authentication credentials were not provided.'},
+                                  status=status.HTTP_401_UNAUTHORIZED)
+    return user, None
+
+
+async def package_list(request):
+    return await paginated_list(request, build_view(PackageViewSet, request))
+
+
+async def package_detail(request, pk):
+    return await retrieve(build_view(PackageViewSet, request), pk)
+
+
+async def payment_list(request):
+    user, error = await get_user_or_401(request)
+    if error:
+        return error
+    return await paginated_list(request, build_view(PaymentViewSet, request, user))
+
+
+async def payment_detail(request, pk):
+    user, error = await get_user_or_401(request)
+    if error:
+        return error
+    return await retrieve(build_view(PaymentViewSet, request, user), pk)
+
+
+async def tudo_list(request):
+    return await paginated_list(request, build_view(TuDoViewSet, request), descending=False)
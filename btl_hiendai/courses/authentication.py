@@ -0,0 +1,127 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils import timezone
+from oauth2_provider.contrib.rest_framework import OAuth2Authentication
+
+# Cache access token đã xác thực trong bộ nhớ tiến trình (LRU + TTL).
+# Request có token nằm trong cache không cần truy vấn DB. Token bị thu hồi/xóa, user hoặc application
+# thay đổi thì bị xóa khỏi cache ngay qua signal (signals.py); ở các tiến trình khác, TTL giới hạn độ trễ.
+
+
+def get_setting(name, default):
+    return getattr(settings, f'COURSES_TOKEN_CACHE_{name}', default)
+
+
+class TokenCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    @staticmethod
+    def key(token):
+        # Không giữ token gốc trong bộ nhớ
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def get(self, token):
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry['cached_until'] <= time.monotonic() or entry['expires'] <= timezone.now():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, access_token):
+        if self.maxsize <= 0:
+            return
+        entry = {
+            'access_token': access_token,
+            'user_id': access_token.user_id,
+            'application_id': access_token.application_id,
+            'scopes': access_token.scope,
+            'expires': access_token.expires,
+            'cached_until': time.monotonic() + self.ttl,
+        }
+        key = self.key(access_token.token)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def evict(self, token):
+        with self._lock:
+            self._entries.pop(self.key(token), None)
+
+    def evict_where(self, name, value):
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry[name] == value]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = TokenCache(get_setting('SIZE', 1000), get_setting('TTL', 60))
+    return _cache
+
+
+def copy_token(access_token):
+    # Bản sao cho từng request: view có thể sửa request.user (vd. PATCH current-user)
+    token = copy.copy(access_token)
+    token.user = copy.copy(access_token.user)
+    return token
+
+
+def bearer_token(request):
+    auth = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if len(auth) == 2 and auth[0].lower() == 'bearer':
+        return auth[1]
+    return None
+
+
+class CachingOAuth2Authentication(OAuth2Authentication):
+    def authenticate(self, request):
+        token = bearer_token(request)
+        if token is None:
+            return super().authenticate(request)
+
+        token_cache = get_token_cache()
+        entry = token_cache.get(token)
+        if entry is not None:
+            access_token = copy_token(entry['access_token'])
+            return access_token.user, access_token
+
+        result = super().authenticate(request)
+        if result is not None:
+            user, access_token = result
+            if access_token is not None and access_token.user_id is not None:
+                token_cache.set(copy_token(access_token))
+        return result
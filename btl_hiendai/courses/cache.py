@@ -0,0 +1,75 @@
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+
+_MISSING = object()
+_lock = threading.Lock()
+_stats = Counter()
+
+SERVICES_VERSION_KEY = 'courses:services:version'
+
+
+def get_cache():
+    return caches[getattr(settings, 'COURSES_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+    return getattr(settings, 'COURSES_CACHE_TIMEOUT', 60 * 60)
+
+
+def _count(name, result):
+    with _lock:
+        _stats[f'{name}.{result}'] += 1
+
+
+def stats():
+    with _lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
+
+
+def read_through(name, key, builder):
+    cache = get_cache()
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        _count(name, 'hit')
+        return value
+    _count(name, 'miss')
+    value = builder()
+    cache.set(key, value, get_timeout())
+    return value
+
+
+def _services_version():
+    # Phiên bản của danh mục dịch vụ: đổi phiên bản là vô hiệu hóa mọi key phụ thuộc
+    cache = get_cache()
+    version = cache.get(SERVICES_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.add(SERVICES_VERSION_KEY, version, None)
+        version = cache.get(SERVICES_VERSION_KEY, version)
+    return version
+
+
+def service_catalog(builder):
+    return read_through('service_catalog', f'courses:services:{_services_version()}', builder)
+
+
+def bill_services(bill_id, builder):
+    return read_through('bill_services', f'courses:bill:{bill_id}:services:{_services_version()}', builder)
+
+
+def invalidate_services():
+    get_cache().set(SERVICES_VERSION_KEY, time.time_ns(), None)
+
+
+def invalidate_bills(bill_ids):
+    version = _services_version()
+    get_cache().delete_many([f'courses:bill:{pk}:services:{version}' for pk in bill_ids])
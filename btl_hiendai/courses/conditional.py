@@ -0,0 +1,88 @@
+import hashlib
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from rest_framework.response import Response
+
+from .models import ResourceVersion
+
+
+def _bump(names):
+    now = timezone.now()
+    for name in sorted(names):
+        if not ResourceVersion.objects.filter(name=name).update(version=F('version') + 1, updated_at=now):
+            ResourceVersion.objects.get_or_create(name=name, defaults={'version': 1})
+
+
+class PendingBumps:
+    # Các tài nguyên cần tăng version khi transaction hiện tại commit
+    def __init__(self):
+        self.names = set()
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        _bump(self.names)
+
+
+def bump(*names, using=None):
+    # Dòng ResourceVersion dùng chung cho mọi thao tác ghi: tăng version sau khi commit, mỗi tài nguyên
+    # một lần cho mỗi mức transaction/savepoint, để không giữ khóa dòng này suốt transaction của request ghi
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        _bump(names)
+        return
+    # run_on_commit: (savepoint ids, hàm, robust); savepoint bị rollback thì PendingBumps của nó bị bỏ theo
+    savepoint_ids = set(connection.savepoint_ids)
+    pending = next((func for sids, func, *_ in connection.run_on_commit
+                    if isinstance(func, PendingBumps) and not func.done and sids == savepoint_ids), None)
+    if pending is None:
+        pending = PendingBumps()
+        transaction.on_commit(pending, using=using)
+    pending.names.update(names)
+
+
+def current(names):
+    return {name: (version, updated_at) for name, version, updated_at in
+            ResourceVersion.objects.filter(name__in=names).values_list('name', 'version', 'updated_at')}
+
+
+class ConditionalGetMixin:
+    # ETag tính từ ResourceVersion (một câu truy vấn), không serialize dữ liệu; If-None-Match khớp thì trả 304 ngay.
+    # Không gửi Last-Modified: HTTP-date chỉ chính xác tới giây nên hai thay đổi trong cùng một giây
+    # sẽ khiến If-Modified-Since trả 304 với dữ liệu cũ.
+    etag_resources = ()
+
+    def get_etag(self, request, versions):
+        user = request.user
+        parts = [request.get_full_path(), request.headers.get('Accept', ''),
+                 str(user.pk) if user.is_authenticated else '-']
+        parts += [f'{name}:{versions.get(name, (0, None))[0]}' for name in self.etag_resources]
+        return quote_etag(hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest())
+
+    def conditional_response(self, request, handler, *args, **kwargs):
+        versions = current(self.etag_resources)
+        etag = self.get_etag(request, versions)
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            patch_vary_headers(response, ['Authorization'])
+        return response
+
+
+class ConditionalListMixin(ConditionalGetMixin):
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().list, *args, **kwargs)
+
+
+class ConditionalRetrieveMixin(ConditionalGetMixin):
+    def retrieve(self, request, *args, **kwargs):
+        # get_object() trước khi so ETag: object không tồn tại hoặc không có quyền thì trả 404/403, không trả 304
+        instance = self.get_object()
+        return self.conditional_response(request, lambda request: Response(self.get_serializer(instance).data))
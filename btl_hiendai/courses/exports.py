@@ -0,0 +1,162 @@
+import csv
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from .models import Bill, Payment
+
+EXPORT_BATCH_SIZE = 2000
+
+
+class Echo:
+    # File giả cho csv.writer: trả lại ngay dòng vừa ghi
+    def write(self, value):
+        return value
+
+
+def fetch_batch(queryset, last_pk=None, batch_size=EXPORT_BATCH_SIZE):
+    # queryset đã sắp theo pk: lấy lô kế tiếp sau last_pk
+    if last_pk is not None:
+        queryset = queryset.filter(pk__gt=last_pk)
+    return list(queryset[:batch_size])
+
+
+def iter_batches(queryset, batch_size=EXPORT_BATCH_SIZE):
+    # Duyệt theo khóa chính (pk > last) từng lô: bộ nhớ không đổi trên mọi DB,
+    # kể cả MySQL nơi driver nạp toàn bộ kết quả của một câu truy vấn vào bộ nhớ
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        batch = fetch_batch(queryset, last_pk, batch_size)
+        if not batch:
+            return
+        yield from batch
+        last_pk = batch[-1].pk
+
+
+def service_lines(bill):
+    if bill is None:
+        return []
+    return [{'id': s.pk, 'name': s.name, 'price': s.priceService} for s in bill.service.all()]
+
+
+def payment_queryset(queryset=None):
+    if queryset is None:
+        queryset = Payment.objects.all()
+    return queryset.select_related('bill').prefetch_related('bill__service')
+
+
+def payment_row(p):
+    return {
+        'id': p.pk,
+        'transaction_id': p.transaction_id,
+        'user': p.user_id,
+        'bill': p.bill_id,
+        'bill_name': p.bill.name if p.bill else None,
+        'status': p.status,
+        'amount': p.amount,
+        'payment_date': p.payment_date,
+        'bill_total': p.bill.total_amount if p.bill else None,
+        'services': service_lines(p.bill),
+    }
+
+
+def payment_rows(queryset=None):
+    for p in iter_batches(payment_queryset(queryset)):
+        yield payment_row(p)
+
+
+def bill_queryset(queryset=None):
+    if queryset is None:
+        queryset = Bill.objects.all()
+    return queryset.prefetch_related('service')
+
+
+def bill_row(b):
+    return {
+        'id': b.pk,
+        'name': b.name,
+        'bill_date': b.bill_date,
+        'payment_method': b.payment_method,
+        'total_amount': b.total_amount,
+        'services': service_lines(b),
+    }
+
+
+def bill_rows(queryset=None):
+    for b in iter_batches(bill_queryset(queryset)):
+        yield bill_row(b)
+
+
+def _row_batch(queryset, row_func, last_pk):
+    batch = fetch_batch(queryset, last_pk, EXPORT_BATCH_SIZE)
+    return [row_func(obj) for obj in batch], batch[-1].pk if batch else None
+
+
+async def aiter_rows(queryset, row_func):
+    # Dưới ASGI, StreamingHttpResponse gom cả iterator đồng bộ bằng sync_to_async(list) trước khi gửi,
+    # nên mỗi lô được lấy riêng qua sync_to_async để dữ liệu được gửi dần
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        rows, last_pk = await sync_to_async(_row_batch)(queryset, row_func, last_pk)
+        if not rows:
+            return
+        for row in rows:
+            yield row
+
+
+def _csv_value(value):
+    if isinstance(value, list):
+        return '|'.join(f"{s['name']}:{s['price']}" for s in value)
+    return '' if value is None else value
+
+
+def stream_csv(rows, fields):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([_csv_value(row[f]) for f in fields])
+
+
+def stream_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+async def astream_csv(rows, fields):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    async for row in rows:
+        yield writer.writerow([_csv_value(row[f]) for f in fields])
+
+
+async def astream_ndjson(rows):
+    async for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+EXPORTS = {
+    'payments': (payment_queryset, payment_row, ['id', 'transaction_id', 'user', 'bill', 'bill_name', 'status',
+                                                 'amount', 'payment_date', 'bill_total', 'services']),
+    'bills': (bill_queryset, bill_row, ['id', 'name', 'bill_date', 'payment_method', 'total_amount', 'services']),
+}
+
+
+def export_response(name, output='csv', queryset=None, request=None):
+    queryset_func, row_func, fields = EXPORTS[name]
+    queryset = queryset_func(queryset)
+    # request của DRF bọc HttpRequest gốc
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        rows = aiter_rows(queryset, row_func)
+        content = astream_ndjson(rows) if output == 'ndjson' else astream_csv(rows, fields)
+    else:
+        rows = (row_func(obj) for obj in iter_batches(queryset))
+        content = stream_ndjson(rows) if output == 'ndjson' else stream_csv(rows, fields)
+    content_type = 'application/x-ndjson' if output == 'ndjson' else 'text/csv'
+    response = StreamingHttpResponse(content, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{name}.{output}"'
+    return response
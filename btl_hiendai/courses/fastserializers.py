@@ -0,0 +1,121 @@
+import threading
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import fields as drf_fields, relations, serializers
+from rest_framework.response import Response
+
+# Đường đọc nhanh cho các action list: đọc .values() thay vì tạo model instance,
+# mỗi trường được "biên dịch" một lần thành (key, cột, hàm chuyển đổi).
+# Hàm chuyển đổi chính là to_representation của field DRF nên JSON giống hệt serializer thường.
+# Serializer có trường không đọc được từ .values() (many-to-many, source='*', to_representation riêng...)
+# thì dùng serializer thường.
+
+IDENTITY_FIELDS = (drf_fields.CharField, drf_fields.IntegerField)
+
+_MISSING = object()
+_readers = {}
+_readers_lock = threading.Lock()
+
+
+class _Row:
+    # Đối tượng giả cho ModelField (vd. CloudinaryField):
+    # DRF đọc giá trị qua model_field.value_from_object(obj)
+    def __init__(self, attname, value):
+        setattr(self, attname, value)
+
+
+def _model_field_converter(field):
+    attname = field.model_field.attname
+    return lambda value: field.to_representation(_Row(attname, value))
+
+
+def compile_field(model, field):
+    # Trả về (cột trong .values(), hàm chuyển đổi hoặc None) hoặc None nếu không hỗ trợ
+    if field.source == '*' or len(field.source_attrs) != 1:
+        return None
+    try:
+        model_field = model._meta.get_field(field.source)
+    except FieldDoesNotExist:
+        return None
+    if not model_field.concrete or model_field.many_to_many:
+        return None
+
+    if isinstance(field, relations.RelatedField):
+        if not isinstance(field, relations.PrimaryKeyRelatedField) or not model_field.is_relation:
+            return None
+        # PKOnlyObject: DRF chỉ trả khóa chính (<fk>_id)
+        return model_field.name, field.pk_field.to_representation if field.pk_field is not None else None
+    if model_field.is_relation:
+        return None
+    if isinstance(field, drf_fields.ModelField):
+        return model_field.name, _model_field_converter(field)
+    if type(field) in IDENTITY_FIELDS:
+        return model_field.name, None
+    return model_field.name, field.to_representation
+
+
+class ValuesReader:
+    def __init__(self, columns, fields):
+        self.columns = columns
+        self.fields = fields
+
+    @classmethod
+    def compile(cls, serializer):
+        if not isinstance(serializer, serializers.ModelSerializer) or \
+                type(serializer).to_representation is not serializers.ModelSerializer.to_representation:
+            return None
+        model = serializer.Meta.model
+        fields = []
+        for field in serializer._readable_fields:
+            compiled = compile_field(model, field)
+            if compiled is None:
+                return None
+            fields.append((field.field_name,) + compiled)
+        columns = list(dict.fromkeys(column for _, column, _ in fields))
+        return cls(columns, tuple(fields))
+
+    def values(self, queryset, extra=()):
+        columns = self.columns + [c for c in extra if c not in self.columns]
+        return queryset.select_related(None).prefetch_related(None).values(*columns)
+
+    def to_representation(self, row):
+        ret = {}
+        for key, column, convert in self.fields:
+            value = row[column]
+            ret[key] = value if value is None or convert is None else convert(value)
+        return ret
+
+    def data(self, rows):
+        to_representation = self.to_representation
+        return [to_representation(row) for row in rows]
+
+
+def get_reader(serializer):
+    # Cache theo lớp serializer và tập trường (sparse fieldsets cho ra tập trường khác nhau)
+    key = (type(serializer), tuple(serializer.fields))
+    reader = _readers.get(key, _MISSING)
+    if reader is _MISSING:
+        reader = ValuesReader.compile(serializer)
+        with _readers_lock:
+            _readers[key] = reader
+    return reader
+
+
+class FastListMixin:
+    # Thay ListModelMixin.list: phân trang trên .values() rồi chuyển thẳng sang dict
+    def list(self, request, *args, **kwargs):
+        reader = get_reader(self.get_serializer())
+        if reader is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        # Cursor pagination cần các cột sắp xếp trong từng dòng
+        ordering = getattr(self.paginator, 'ordering', None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        rows = reader.values(queryset, [o.lstrip('-') for o in ordering])
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(reader.data(page))
+        return Response(reader.data(rows))
@@ -0,0 +1,128 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.serializers import ListSerializer
+
+# Sparse fieldsets: ?fields=id,status chỉ trả các trường được chọn, ?exclude=nameService bỏ bớt trường.
+# Viewset thu hẹp luôn câu SQL bằng .only()/.defer() nên dữ liệu đọc từ DB cũng giảm theo payload.
+
+
+def parse_names(value):
+    if value is None:
+        return None
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def requested_fields(request):
+    if request is None or request.method not in SAFE_METHODS:
+        return None, None
+    params = getattr(request, 'query_params', request.GET)
+    return parse_names(params.get('fields')), parse_names(params.get('exclude'))
+
+
+def select_keys(rows, fields=None, exclude=None):
+    # Áp dụng fields/exclude lên dữ liệu đã serialize sẵn (vd. lấy từ cache)
+    if fields is None and not exclude:
+        return rows
+    exclude = set(exclude or ())
+    return [{k: v for k, v in row.items() if (fields is None or k in fields) and k not in exclude} for row in rows]
+
+
+class SparseFieldsMixin:
+    # Dùng cho ModelSerializer. Có thể truyền trực tiếp fields=[...] / exclude=[...] khi khởi tạo,
+    # nếu không thì đọc từ query string của request (chỉ với serializer gốc và request GET/HEAD).
+    def __init__(self, *args, **kwargs):
+        self._sparse_fields = kwargs.pop('fields', None)
+        self._sparse_exclude = kwargs.pop('exclude', None)
+        super().__init__(*args, **kwargs)
+
+    def get_sparse_params(self):
+        if self._sparse_fields is not None or self._sparse_exclude is not None:
+            return self._sparse_fields, self._sparse_exclude
+        parent = self.parent
+        if isinstance(parent, ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return None, None
+        return requested_fields(self.context.get('request'))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        only, exclude = self.get_sparse_params()
+        if only is not None:
+            fields = {name: field for name, field in fields.items() if name in only}
+        for name in exclude or ():
+            fields.pop(name, None)
+        return fields
+
+
+def required_columns(serializer):
+    # Các trường model cần đọc để serialize; None nếu có trường không suy ra được (source='*', property...)
+    model = serializer.Meta.model
+    dependencies = getattr(serializer.Meta, 'field_dependencies', {})
+    columns, relations = {model._meta.pk.name}, set()
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if field.source == '*':
+            return None
+        for source in [field.source] + list(dependencies.get(name, ())):
+            try:
+                model_field = model._meta.get_field(source.split('.')[0])
+            except FieldDoesNotExist:
+                return None
+            if model_field.concrete and not model_field.many_to_many:
+                columns.add(model_field.name)
+            else:
+                relations.add(model_field.name)
+    return columns, relations
+
+
+def _select_related_lookups(tree, prefix=''):
+    for name, subtree in tree.items():
+        yield prefix + name
+        yield from _select_related_lookups(subtree, f'{prefix}{name}__')
+
+
+def narrow_queryset(queryset, serializer, fields=None, exclude=None, keep=()):
+    required = required_columns(serializer)
+    if required is None:
+        return queryset
+    columns, relations = required
+
+    # Bỏ các join/prefetch của trường không còn được trả về (Django không cho vừa defer vừa select_related)
+    select = queryset.query.select_related
+    if select:
+        lookups = [] if select is True else [lookup for lookup in _select_related_lookups(select)
+                                             if lookup.split('__')[0] in columns]
+        queryset = queryset.select_related(None)
+        if lookups:
+            queryset = queryset.select_related(*lookups)
+    prefetches = queryset._prefetch_related_lookups
+    if prefetches:
+        kept = [lookup for lookup in prefetches
+                if (lookup.prefetch_through if isinstance(lookup, Prefetch) else lookup).split('__')[0] in relations]
+        queryset = queryset.prefetch_related(None)
+        if kept:
+            queryset = queryset.prefetch_related(*kept)
+
+    columns.update(keep)
+    if fields is not None:
+        return queryset.only(*columns)
+    concrete = {f.name for f in queryset.model._meta.concrete_fields}
+    return queryset.defer(*(concrete - columns))
+
+
+class SparseFieldsetMixin:
+    # Dùng cho viewset: list/retrieve với ?fields=/?exclude= chỉ SELECT các cột serializer cần.
+    # sparse_keep_fields: các cột view luôn cần (vd. kiểm tra quyền theo chủ sở hữu)
+    sparse_keep_fields = ()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        fields, exclude = requested_fields(self.request)
+        if fields is None and not exclude:
+            return queryset
+        return narrow_queryset(queryset, self.get_serializer(), fields, exclude, self.sparse_keep_fields)
@@ -0,0 +1,39 @@
+from cloudinary import CloudinaryResource
+
+THUMBNAIL_OPTIONS = {'width': 150, 'height': 150, 'crop': 'fill'}
+
+# field ảnh -> (field lưu URL, field lưu URL thumbnail)
+IMAGE_URL_FIELDS = {
+    'avatar': ('avatar_url', 'avatar_thumbnail_url'),
+    'payment_image': ('payment_image_url', 'payment_image_thumbnail_url'),
+}
+
+
+def image_urls(resource):
+    # URL giao ảnh tính một lần khi lưu, serializer chỉ việc đọc ra
+    if not isinstance(resource, CloudinaryResource) or not resource.public_id:
+        return None, None
+    return resource.url, resource.build_url(**THUMBNAIL_OPTIONS)
+
+
+def url_updates(field_name, resource):
+    url_field, thumbnail_field = IMAGE_URL_FIELDS[field_name]
+    url, thumbnail = image_urls(resource)
+    return {url_field: url, thumbnail_field: thumbnail}
+
+
+def sync_image_urls(instance, field_name):
+    # Gán lại các field URL theo giá trị ảnh hiện tại, trả về dict các field đã thay đổi
+    field = instance._meta.get_field(field_name)
+    value = getattr(instance, field_name)
+    if value and not isinstance(value, CloudinaryResource):
+        if hasattr(value, 'chunks'):
+            # UploadedFile: chưa tải lên, URL được tính sau khi lưu
+            return {}
+        value = field.to_python(value)
+    changed = {}
+    for name, url in url_updates(field_name, value).items():
+        if getattr(instance, name) != url:
+            setattr(instance, name, url)
+            changed[name] = url
+    return changed
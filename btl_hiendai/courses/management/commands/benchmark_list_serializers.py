@@ -0,0 +1,68 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from courses import fastserializers, serializers
+from courses.models import Package, SurveyForm, SurveyQuestion, SurveyResponse, TuDo, User
+
+TARGETS = {
+    'package': (Package, serializers.PackageSerializer),
+    'surveyresponse': (SurveyResponse, serializers.SurveyResponseSerializer),
+}
+
+
+class Command(BaseCommand):
+    help = 'So sánh số dòng/giây giữa ModelSerializer và đường đọc .values() (fastserializers)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000,
+                            help='Số dòng tạo tạm cho mỗi bảng (rollback khi xong)')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--target', choices=sorted(TARGETS), action='append')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.seed(options['rows'])
+            for name in options['target'] or sorted(TARGETS):
+                self.run(name, *TARGETS[name], options['repeat'])
+            transaction.set_rollback(True)
+
+    def seed(self, rows):
+        user = User.objects.create(username=f'benchmark-{time.time_ns()}')
+        tudo = TuDo.objects.create(name='benchmark')
+        Package.objects.bulk_create(Package(name=f'package {i}', tuDo=tudo, status='received' if i % 2 else 'waiting')
+                                    for i in range(rows))
+        form = SurveyForm.objects.create(user=user, title='benchmark', description='benchmark')
+        question = SurveyQuestion.objects.create(surveyForm=form, text='benchmark')
+        SurveyResponse.objects.bulk_create(
+            SurveyResponse(surveyForm=form, surveyQuestion=question, answer=f'answer {i}') for i in range(rows))
+
+    def run(self, name, model, serializer_class, repeat):
+        queryset = model.objects.order_by('-id')
+        reader = fastserializers.get_reader(serializer_class())
+        if reader is None:
+            raise CommandError(f'{serializer_class.__name__} không dùng được đường đọc .values()')
+
+        def drf():
+            return serializer_class(list(queryset), many=True).data
+
+        def fast():
+            return reader.data(reader.values(queryset))
+
+        renderer = JSONRenderer()
+        if renderer.render(drf()) != renderer.render(fast()):
+            raise CommandError(f'{name}: JSON của hai đường đọc khác nhau')
+
+        results = {}
+        for label, func in (('ModelSerializer', drf), ('values()', fast)):
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                count = len(func())
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results[label] = count / best
+            self.stdout.write(f'{name} {label}: {count} dòng, {best * 1000:.1f}ms, {count / best:,.0f} dòng/giây')
+        self.stdout.write(f'{name}: nhanh hơn {results["values()"] / results["ModelSerializer"]:.1f} lần')
@@ -0,0 +1,49 @@
+import datetime
+import time
+
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from oauth2_provider.contrib.rest_framework import OAuth2Authentication
+from oauth2_provider.models import get_access_token_model, get_application_model
+from rest_framework.request import Request
+
+from courses.authentication import CachingOAuth2Authentication, get_token_cache
+from courses.models import User
+
+
+class Command(BaseCommand):
+    help = 'Đếm số truy vấn DB mỗi request khi xác thực OAuth2 có và không có cache token'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        n = options['requests']
+        with transaction.atomic():
+            token = self.create_token()
+            factory = RequestFactory()
+            for authentication in (OAuth2Authentication(), CachingOAuth2Authentication()):
+                get_token_cache().clear()
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    for _ in range(n):
+                        request = Request(factory.get('/packages/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+                        user, _ = authentication.authenticate(request)
+                    elapsed = time.perf_counter() - started
+                assert user.username.startswith('benchmark-')
+                self.stdout.write(f'{type(authentication).__name__}: {n} request, {len(queries)} truy vấn '
+                                  f'({len(queries) / n:.3f}/request), {elapsed / n * 1e6:.0f}µs/request')
+            self.stdout.write(f'Cache: {get_token_cache().stats()}')
+            transaction.set_rollback(True)
+
+    def create_token(self):
+        user = User.objects.create(username=f'benchmark-{time.time_ns()}')
+        application = get_application_model().objects.create(
+            name='benchmark', user=user, client_type='confidential', authorization_grant_type='password')
+        access_token = get_access_token_model().objects.create(
+            user=user, application=application, token=f'benchmark-{time.time_ns()}', scope='read write',
+            expires=timezone.now() + datetime.timedelta(hours=1))
+        return access_token.token
@@ -0,0 +1,89 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test.client import RequestFactory
+
+from btl_hiendai.asgi import application as asgi_application
+
+
+class Command(BaseCommand):
+    help = 'So sánh WSGI (thread worker) và ASGI (async view) khi client nhận dữ liệu chậm'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi-path', default='/packages/')
+        parser.add_argument('--asgi-path', default='/async/packages/')
+        parser.add_argument('--host', default='localhost')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--workers', type=int, default=4, help='Số thread worker của WSGI')
+        parser.add_argument('--client-delay', type=float, default=0.05,
+                            help='Thời gian (giây) client chậm cần để nhận xong response')
+
+    def handle(self, *args, **options):
+        n, delay = options['requests'], options['client_delay']
+        self.host = options['host']
+        wsgi = self.run_wsgi(options['wsgi_path'], n, options['workers'], delay)
+        asgi = asyncio.run(self.run_asgi(options['asgi_path'], n, delay))
+
+        self.stdout.write(f'{n} request, client delay {delay * 1000:.0f}ms, WSGI workers={options["workers"]}')
+        for name, (elapsed, latencies, statuses) in (('WSGI', wsgi), ('ASGI', asgi)):
+            latencies = sorted(latencies)
+            self.stdout.write(
+                f'{name}: {elapsed:.2f}s, {n / elapsed:.1f} req/s, '
+                f'p50={statistics.median(latencies) * 1000:.0f}ms, '
+                f'p95={latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f}ms, '
+                f'status={sorted(set(statuses))}')
+
+    def run_wsgi(self, path, n, workers, delay):
+        handler = WSGIHandler()
+        environ = RequestFactory()._base_environ(PATH_INFO=path, REQUEST_METHOD='GET', HTTP_HOST=self.host)
+
+        # Mọi request "đến" cùng lúc; độ trễ tính cả thời gian chờ worker rảnh
+        started = time.perf_counter()
+
+        def one_request(_):
+            statuses = []
+            body = handler(dict(environ), lambda status, headers, exc_info=None: statuses.append(status))
+            for _chunk in body:
+                # worker bị giữ trong lúc client chậm nhận dữ liệu
+                time.sleep(delay)
+            body.close()
+            return time.perf_counter() - started, int(statuses[0].split()[0])
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(one_request, range(n)))
+        return time.perf_counter() - started, [r[0] for r in results], [r[1] for r in results]
+
+    async def run_asgi(self, path, n, delay):
+        async def one_request():
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+                'headers': [(b'host', self.host.encode())], 'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+            }
+            statuses = []
+            sent = False
+
+            async def receive():
+                nonlocal sent
+                if not sent:
+                    sent = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+                elif message['type'] == 'http.response.body':
+                    # client chậm: chỉ coroutine này chờ, event loop vẫn phục vụ request khác
+                    await asyncio.sleep(delay)
+
+            await asgi_application(scope, receive, send)
+            return time.perf_counter() - started, statuses[0]
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(one_request() for _ in range(n)))
+        return time.perf_counter() - started, [r[0] for r in results], [r[1] for r in results]
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from courses.uploads import get_queue, parse_spool_name, pending_spool_files
+
+
+class Command(BaseCommand):
+    help = 'Tải lên các ảnh còn nằm trong thư mục spool (sau khi khởi động lại hoặc tải lên thất bại)'
+
+    def handle(self, *args, **options):
+        queue = get_queue()
+        done = failed = skipped = 0
+        for path in pending_spool_files():
+            try:
+                parse_spool_name(path)
+            except ValueError as e:
+                self.stderr.write(f'Bỏ qua {e}')
+                skipped += 1
+                continue
+            # Chạy trực tiếp trong tiến trình này, không qua thread pool
+            if queue.process(path):
+                done += 1
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(f'Đã tải lên {done} ảnh, lỗi {failed}, bỏ qua {skipped}'))
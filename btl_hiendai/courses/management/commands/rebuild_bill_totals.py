@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min
+
+from courses.models import Bill
+
+
+class Command(BaseCommand):
+    help = 'Tính lại tổng tiền (total_amount) cho toàn bộ hóa đơn'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        bounds = Bill.objects.aggregate(lo=Min('pk'), hi=Max('pk'))
+        updated = 0
+        if bounds['lo'] is not None:
+            # Mỗi lô là một câu UPDATE ... SET total_amount = (SELECT SUM(...)) theo khoảng id
+            for start in range(bounds['lo'], bounds['hi'] + 1, batch_size):
+                with transaction.atomic():
+                    updated += Bill.refresh_totals(Bill.objects.filter(pk__gte=start, pk__lt=start + batch_size))
+        self.stdout.write(self.style.SUCCESS(f'Đã cập nhật {updated} hóa đơn'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from courses.search import RESOURCES, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Tạo lại chỉ mục tìm kiếm (SearchEntry) cho món hàng, phản hồi và dịch vụ'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--resource', choices=sorted(RESOURCES), action='append',
+                            help='Chỉ tạo lại cho loại này (có thể lặp lại)')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            counts = rebuild_index(options['resource'])
+        for resource, count in counts.items():
+            self.stdout.write(f'{resource}: {count} object')
+        self.stdout.write(self.style.SUCCESS('Đã tạo lại chỉ mục tìm kiếm'))
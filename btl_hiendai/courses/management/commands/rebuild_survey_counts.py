@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from courses.models import SurveyForm
+from courses.surveys import rebuild_answer_counts
+
+
+class Command(BaseCommand):
+    help = 'Tính lại bảng đếm câu trả lời khảo sát (SurveyAnswerCount) từ SurveyResponse'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--survey-form', type=int, help='Chỉ tính lại cho một phiếu khảo sát')
+
+    def handle(self, *args, **options):
+        survey_form = None
+        if options['survey_form']:
+            survey_form = SurveyForm.objects.get(pk=options['survey_form'])
+        rebuild_answer_counts(survey_form)
+        self.stdout.write(self.style.SUCCESS('Đã tính lại bộ đếm câu trả lời'))
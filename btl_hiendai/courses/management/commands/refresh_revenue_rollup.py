@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from courses.stats import refresh_revenue_rollup
+
+
+class Command(BaseCommand):
+    help = 'Cập nhật bảng RevenueRollup cho các tháng có thanh toán thay đổi từ lần chạy trước'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Tính lại toàn bộ các tháng')
+
+    def handle(self, *args, **options):
+        months = refresh_revenue_rollup(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'Đã tính lại {len(months)} tháng'))
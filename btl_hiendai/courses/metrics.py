@@ -0,0 +1,192 @@
+import bisect
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import connections
+from django.http import HttpResponse
+
+# Đo thời gian xử lý, số truy vấn và thời gian DB theo tên view (url_name, vd. payments-list),
+# xuất dạng Prometheus tại /metrics.
+# Mỗi thread ghi vào bộ đếm riêng (không cần lock khi ghi), /metrics cộng dồn bộ đếm của mọi thread trong tiến trình.
+# Response dạng streaming (export) chỉ được đo tới lúc view trả về response.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+PROCESS_START = time.time()
+
+
+class ViewStats:
+    __slots__ = ('count', 'duration', 'queries', 'db_duration', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.db_duration = 0.0
+        # số request rơi vào từng khoảng (không cộng dồn), phần tử cuối là +Inf
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+
+class ThreadStats:
+    def __init__(self):
+        self.views = defaultdict(ViewStats)
+        self.responses = defaultdict(int)
+
+
+_local = threading.local()
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def thread_stats():
+    stats = getattr(_local, 'stats', None)
+    if stats is None:
+        stats = _local.stats = ThreadStats()
+        # chỉ lock một lần khi thread ghi lần đầu
+        with _registry_lock:
+            _registry.append(stats)
+    return stats
+
+
+def record(view, method, status_code, duration, queries, db_duration):
+    stats = thread_stats()
+    view_stats = stats.views[view, method]
+    view_stats.count += 1
+    view_stats.duration += duration
+    view_stats.queries += queries
+    view_stats.db_duration += db_duration
+    view_stats.buckets[bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+    stats.responses[view, method, status_code] += 1
+
+
+def reset():
+    with _registry_lock:
+        for stats in _registry:
+            stats.views.clear()
+            stats.responses.clear()
+
+
+def snapshot():
+    with _registry_lock:
+        registry = list(_registry)
+    views = defaultdict(ViewStats)
+    responses = defaultdict(int)
+    for stats in registry:
+        for key, view_stats in list(stats.views.items()):
+            total = views[key]
+            total.count += view_stats.count
+            total.duration += view_stats.duration
+            total.queries += view_stats.queries
+            total.db_duration += view_stats.db_duration
+            total.buckets = [a + b for a, b in zip(total.buckets, view_stats.buckets)]
+        for key, count in list(stats.responses.items()):
+            responses[key] += count
+    return views, responses
+
+
+def _labels(**labels):
+    return ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                    for name, value in labels.items())
+
+
+def render():
+    views, responses = snapshot()
+    lines = [
+        '# HELP courses_process_start_time_seconds Thời điểm tiến trình khởi động.',
+        '# TYPE courses_process_start_time_seconds gauge',
+        f'courses_process_start_time_seconds{{{_labels(pid=os.getpid())}}} {PROCESS_START}',
+        '# HELP courses_http_responses_total Số response theo view, method và status.',
+        '# TYPE courses_http_responses_total counter',
+    ]
+    for (view, method, status_code), count in sorted(responses.items()):
+        lines.append(f'courses_http_responses_total{{{_labels(view=view, method=method, status=status_code)}}} {count}')
+
+    lines += ['# HELP courses_http_request_duration_seconds Thời gian xử lý request theo view.',
+              '# TYPE courses_http_request_duration_seconds histogram']
+    for (view, method), stats in sorted(views.items()):
+        labels = _labels(view=view, method=method)
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), stats.buckets):
+            cumulative += count
+            lines.append(f'courses_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'courses_http_request_duration_seconds_sum{{{labels}}} {stats.duration}')
+        lines.append(f'courses_http_request_duration_seconds_count{{{labels}}} {stats.count}')
+
+    lines += ['# HELP courses_db_queries_total Số câu truy vấn SQL theo view.',
+              '# TYPE courses_db_queries_total counter']
+    lines += [f'courses_db_queries_total{{{_labels(view=view, method=method)}}} {stats.queries}'
+              for (view, method), stats in sorted(views.items())]
+    lines += ['# HELP courses_db_query_duration_seconds_total Tổng thời gian chạy SQL theo view.',
+              '# TYPE courses_db_query_duration_seconds_total counter']
+    lines += [f'courses_db_query_duration_seconds_total{{{_labels(view=view, method=method)}}} {stats.db_duration}'
+              for (view, method), stats in sorted(views.items())]
+    return '\n'.join(lines) + '\n'
+
+
+class QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+def wrap_connections(wrapper):
+    # execute_wrapper gắn vào connection của thread hiện tại
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+    return stack
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with wrap_connections(timer):
+            response = self.get_response(request)
+        self.record_request(request, response, time.perf_counter() - started, timer)
+        return response
+
+    async def __acall__(self, request):
+        # Dưới ASGI, ORM chạy trong thread của sync_to_async (thread_sensitive) nên gắn bộ đếm ở thread đó
+        timer = QueryTimer()
+        started = time.perf_counter()
+        stack = await sync_to_async(wrap_connections)(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.record_request(request, response, time.perf_counter() - started, timer)
+        return response
+
+    @staticmethod
+    def record_request(request, response, duration, timer):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        record(view or 'unnamed', request.method, response.status_code, duration, timer.count, timer.duration)
+
+
+def metrics_view(request):
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.13 on 2026-10-18 13:30
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_total_amount(apps, schema_editor):
+    Bill = apps.get_model('courses', 'Bill')
+    totals = Bill.service.through.objects.filter(bill_id=OuterRef('pk')) \
+        .values('bill_id').annotate(total=Sum('service__priceService')).values('total')
+    Bill.objects.update(total_amount=Coalesce(Subquery(totals, output_field=models.FloatField()), Value(0.0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0020_alter_payment_payment_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bill',
+            name='total_amount',
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(fill_total_amount, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.13 on 2026-10-18 13:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0021_bill_total_amount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_run', models.DateField(null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RevenueRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('payment_method', models.CharField(max_length=20)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('paid_count', models.IntegerField(default=0)),
+                ('total', models.FloatField(default=0)),
+                ('paid_total', models.FloatField(default=0)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_rollups', to='courses.service')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='revenuerollup',
+            constraint=models.UniqueConstraint(fields=('month', 'service', 'payment_method'), name='unique_revenue_rollup'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.13 on 2026-10-18 13:36
+
+import hashlib
+
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_answer_counts(apps, schema_editor):
+    SurveyResponse = apps.get_model('courses', 'SurveyResponse')
+    SurveyAnswerCount = apps.get_model('courses', 'SurveyAnswerCount')
+    rows = SurveyResponse.objects.values('surveyForm_id', 'surveyQuestion_id', 'answer') \
+        .annotate(count=Count('id')).order_by()
+    SurveyAnswerCount.objects.bulk_create([
+        SurveyAnswerCount(surveyForm_id=r['surveyForm_id'], surveyQuestion_id=r['surveyQuestion_id'],
+                          answer=r['answer'], answer_hash=hashlib.sha1(r['answer'].encode('utf-8')).hexdigest(),
+                          count=r['count'])
+        for r in rows.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0023_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SurveyAnswerCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('answer', models.TextField()),
+                ('answer_hash', models.CharField(max_length=40)),
+                ('count', models.IntegerField(default=0)),
+                ('surveyForm', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_counts', to='courses.surveyform')),
+                ('surveyQuestion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='answer_counts', to='courses.surveyquestion')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='surveyanswercount',
+            constraint=models.UniqueConstraint(fields=('surveyQuestion', 'answer_hash'), name='unique_survey_answer_count'),
+        ),
+        migrations.RunPython(fill_answer_counts, migrations.RunPython.noop),
+    ]
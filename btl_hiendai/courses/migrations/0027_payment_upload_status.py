@@ -0,0 +1,28 @@
+# Generated by Django 4.2.13 on 2026-10-18 13:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0026_changelog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='upload_attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='upload_error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='upload_status',
+            field=models.CharField(choices=[('none', 'Khong co anh'), ('pending', 'Cho tai len'), ('uploading', 'Dang tai len'), ('done', 'Da tai len'), ('failed', 'Tai len that bai')], default='none', max_length=20),
+        ),
+    ]
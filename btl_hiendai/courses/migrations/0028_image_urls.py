@@ -0,0 +1,48 @@
+# Generated by Django 4.2.13 on 2026-10-18 13:44
+
+from django.db import migrations, models
+
+THUMBNAIL_OPTIONS = {'width': 150, 'height': 150, 'crop': 'fill'}
+
+
+def fill_image_urls(apps, schema_editor):
+    for model_name, field in (('User', 'avatar'), ('Payment', 'payment_image')):
+        model = apps.get_model('courses', model_name)
+        rows = []
+        for obj in model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''}).iterator():
+            resource = getattr(obj, field)
+            setattr(obj, f'{field}_url', resource.url)
+            setattr(obj, f'{field}_thumbnail_url', resource.build_url(**THUMBNAIL_OPTIONS))
+            rows.append(obj)
+        model.objects.bulk_update(rows, [f'{field}_url', f'{field}_thumbnail_url'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0027_payment_upload_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='payment_image_thumbnail_url',
+            field=models.CharField(blank=True, max_length=500, null=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='payment_image_url',
+            field=models.CharField(blank=True, max_length=500, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avatar_thumbnail_url',
+            field=models.CharField(blank=True, max_length=500, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avatar_url',
+            field=models.CharField(blank=True, max_length=500, null=True),
+        ),
+        migrations.RunPython(fill_image_urls, migrations.RunPython.noop),
+    ]
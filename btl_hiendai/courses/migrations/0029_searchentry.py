@@ -0,0 +1,65 @@
+# Generated by Django 4.2.13 on 2026-10-18 13:53
+
+import html
+import re
+import unicodedata
+from collections import Counter
+
+from django.db import migrations, models
+from django.utils.html import strip_tags
+
+# Bản sao cách tách từ của courses/search.py tại thời điểm tạo migration (không import mã hiện tại của app)
+TERM_MAX_LENGTH = 50
+# resource -> (model, {trường: (trọng số, là RichTextField)})
+RESOURCES = {
+    'package': ('Package', {'name': (1, False)}),
+    'feedback': ('Feedback', {'subject': (3, False), 'message': (1, False)}),
+    'service': ('Service', {'name': (3, False), 'nameService': (1, True)}),
+}
+
+
+def terms(text):
+    text = unicodedata.normalize('NFKD', text.replace('đ', 'd').replace('Đ', 'D'))
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    return [word[:TERM_MAX_LENGTH] for word in re.findall(r'\w+', text)]
+
+
+def fill_search_index(apps, schema_editor):
+    SearchEntry = apps.get_model('courses', 'SearchEntry')
+    for resource, (model_name, fields) in RESOURCES.items():
+        entries = []
+        for obj in apps.get_model('courses', model_name).objects.order_by('pk').iterator():
+            weights = Counter()
+            for name, (weight, rich_text) in fields.items():
+                value = getattr(obj, name) or ''
+                if rich_text:
+                    value = html.unescape(strip_tags(value))
+                for term in terms(value):
+                    weights[term] += weight
+            entries += [SearchEntry(resource=resource, object_id=obj.pk, term=term, weight=weight)
+                        for term, weight in weights.items()]
+        SearchEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0028_image_urls'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(max_length=30)),
+                ('object_id', models.BigIntegerField()),
+                ('term', models.CharField(max_length=50)),
+                ('weight', models.IntegerField(default=1)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['resource', 'term'], name='searchentry_term_idx'), models.Index(fields=['resource', 'object_id'], name='searchentry_object_idx')],
+            },
+        ),
+        migrations.RunPython(fill_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.13 on 2026-10-18 14:07
+
+from django.db import migrations, models
+
+
+def reset_watermark(apps, schema_editor):
+    # Lần refresh_revenue_rollup sau tính lại mọi tháng để điền PaymentRollup
+    apps.get_model('courses', 'RollupWatermark').objects.filter(name='revenue_rollup').update(last_run=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0029_searchentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('payment_method', models.CharField(max_length=20)),
+                ('payment_count', models.IntegerField(default=0)),
+                ('paid_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupDirtyMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='paymentrollup',
+            constraint=models.UniqueConstraint(fields=('month', 'payment_method'), name='unique_payment_rollup'),
+        ),
+        migrations.RunPython(reset_watermark, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import AbstractUser
 from ckeditor.fields import RichTextField
 from cloudinary.models import CloudinaryField
@@ -12,6 +14,8 @@ class User(AbstractUser):
         ('resident', 'dan cu')
     )
     avatar = CloudinaryField(null=True)
+    avatar_url = models.CharField(max_length=500, blank=True, null=True)
+    avatar_thumbnail_url = models.CharField(max_length=500, blank=True, null=True)
     role = models.CharField(max_length=20, choices=STATUS_CHOICES, default='resident')
     tuDo = models.OneToOneField('TuDo', on_delete=models.CASCADE, related_name='users', null=True)
 
@@ -53,15 +57,26 @@ class Bill(BaseModel):
     bill_date = models.DateField(default=datetime.date.today)
     payment_method = models.CharField(max_length=20, choices=STATUS_CHOICES, default='momo')
     service = models.ManyToManyField(Service, related_name='hoa_don')
+    # Tổng tiền lưu sẵn, được cập nhật qua signals (xem signals.py)
+    total_amount = models.FloatField(default=0)
 
     def __str__(self):
         return self.name
 
     def get_total_amount(self):
-        total_amount = 0
-        for service in self.service.all():
-            total_amount += service.priceService
-        return total_amount
+        return self.total_amount
+
+    @staticmethod
+    def total_amount_subquery():
+        totals = Bill.service.through.objects.filter(bill_id=OuterRef('pk')) \
+            .values('bill_id').annotate(total=Sum('service__priceService')).values('total')
+        return Coalesce(Subquery(totals, output_field=models.FloatField()), Value(0.0))
+
+    @classmethod
+    def refresh_totals(cls, queryset=None):
+        if queryset is None:
+            queryset = cls.objects.all()
+        return queryset.update(total_amount=cls.total_amount_subquery())
 
 
 class Payment(BaseModel):
@@ -75,8 +90,29 @@ class Payment(BaseModel):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     payment_date = models.DateTimeField(auto_now_add=True)
+    UPLOAD_STATUS_CHOICES = (
+        ('none', 'Khong co anh'),
+        ('pending', 'Cho tai len'),
+        ('uploading', 'Dang tai len'),
+        ('done', 'Da tai len'),
+        ('failed', 'Tai len that bai'),
+    )
     payment_image = CloudinaryField(null=True)
+    payment_image_url = models.CharField(max_length=500, blank=True, null=True)
+    payment_image_thumbnail_url = models.CharField(max_length=500, blank=True, null=True)
     transaction_id = models.CharField(max_length=100, blank=True, null=True)
+    # Trạng thái tải ảnh ủy nhiệm chi lên Cloudinary (xem uploads.py)
+    upload_status = models.CharField(max_length=20, choices=UPLOAD_STATUS_CHOICES, default='none')
+    upload_attempts = models.IntegerField(default=0)
+    upload_error = models.TextField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # PaymentViewSet: lọc theo status + active
+            models.Index(fields=['status', 'active'], name='payment_status_active_idx'),
+            # Danh sách thanh toán của từng người dùng, sắp xếp theo payment_date
+            models.Index(fields=['user', 'payment_date'], name='payment_user_date_idx'),
+        ]
 
     def __str__(self):
         return self.transaction_id
@@ -95,6 +131,12 @@ class ResidentFamily(BaseModel):
     sdt = models.CharField(max_length=15)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
 
+    class Meta:
+        indexes = [
+            # UserViewSet.get_access_card: resident_families.filter(active=True)
+            models.Index(fields=['user', 'active'], name='residentfamily_user_active_idx'),
+        ]
+
     # def __init__(self, *args, **kwargs):
     #     super().__init__(args, kwargs)
     #     self.errors = None
@@ -171,6 +213,14 @@ class Package(BaseModel):
     tuDo = models.ForeignKey(TuDo, on_delete=models.CASCADE, related_name='package')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='waiting')
 
+    class Meta:
+        indexes = [
+            # PackageViewSet: lọc theo tuDo + active; name__icontains không dùng được index
+            models.Index(fields=['tuDo', 'active'], name='package_tudo_active_idx'),
+            # TuDoViewSet.get_packages: package.filter(status=...)
+            models.Index(fields=['tuDo', 'status'], name='package_tudo_status_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -219,4 +269,128 @@ class SurveyResponse(BaseModel):
         return f'{self.surveyQuestion.text} - {self.answer}'
 
 
+# Bộ đếm số lần mỗi câu trả lời xuất hiện, cập nhật dần (xem surveys.py)
+class SurveyAnswerCount(models.Model):
+    objects = None
+    surveyForm = models.ForeignKey(SurveyForm, on_delete=models.CASCADE, related_name='answer_counts')
+    surveyQuestion = models.ForeignKey(SurveyQuestion, on_delete=models.CASCADE, related_name='answer_counts')
+    answer = models.TextField()
+    answer_hash = models.CharField(max_length=40)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['surveyQuestion', 'answer_hash'], name='unique_survey_answer_count')
+        ]
+
+    def __str__(self):
+        return f'{self.answer} - {self.count}'
+
+
+# Bảng tổng hợp doanh thu theo tháng (xem stats.refresh_revenue_rollup)
+class RevenueRollup(models.Model):
+    objects = None
+    month = models.DateField()
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='revenue_rollups')
+    payment_method = models.CharField(max_length=20)
+    payment_count = models.IntegerField(default=0)
+    paid_count = models.IntegerField(default=0)
+    total = models.FloatField(default=0)
+    paid_total = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'service', 'payment_method'], name='unique_revenue_rollup')
+        ]
+
+    def __str__(self):
+        return f'{self.month:%Y-%m} - {self.service_id} - {self.payment_method}'
+
+
+# Số thanh toán theo tháng và phương thức thanh toán: mỗi thanh toán đếm một lần
+# (RevenueRollup tính theo từng dịch vụ nên một thanh toán có nhiều dịch vụ nằm ở nhiều dòng)
+class PaymentRollup(models.Model):
+    objects = None
+    month = models.DateField()
+    payment_method = models.CharField(max_length=20)
+    payment_count = models.IntegerField(default=0)
+    paid_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['month', 'payment_method'], name='unique_payment_rollup')
+        ]
+
+    def __str__(self):
+        return f'{self.month:%Y-%m} - {self.payment_method}'
+
+
+# Tháng cần tính lại ở lần refresh_revenue_rollup sau (đánh dấu qua signals, xem signals.py)
+class RollupDirtyMonth(models.Model):
+    objects = None
+    month = models.DateField(unique=True)
+
+    def __str__(self):
+        return f'{self.month:%Y-%m}'
+
+
+class RollupWatermark(models.Model):
+    objects = None
+    name = models.CharField(max_length=50, unique=True)
+    last_run = models.DateField(null=True)
+
+    def __str__(self):
+        return self.name
+
+
+# Số phiên bản theo loại dữ liệu, tăng mỗi khi dữ liệu thay đổi (dùng cho ETag, xem conditional.py)
+class ResourceVersion(models.Model):
+    objects = None
+    name = models.CharField(max_length=50, unique=True)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.name} - {self.version}'
+
+
+# Nhật ký thay đổi cho API đồng bộ /sync/ (xem sync.py); id tăng dần dùng làm token "since"
+class ChangeLog(models.Model):
+    objects = None
+    ACTION_CHOICES = (
+        ('upsert', 'Them/cap nhat'),
+        ('delete', 'Xoa'),
+    )
+    resource = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    # Phạm vi người được nhận thay đổi: 'user:<id>' hoặc 'tudo:<id>'
+    scope = models.CharField(max_length=50)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['scope', 'id'], name='changelog_scope_id_idx'),
+        ]
 
+    def __str__(self):
+        return f'{self.id} - {self.resource}:{self.object_id} {self.action}'
+
+
+# Chỉ mục tìm kiếm (inverted index) cho /search/: mỗi từ đã chuẩn hóa của một object là một dòng (xem search.py)
+class SearchEntry(models.Model):
+    objects = None
+    resource = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    term = models.CharField(max_length=50)
+    # trọng số của trường x số lần xuất hiện
+    weight = models.IntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['resource', 'term'], name='searchentry_term_idx'),
+            models.Index(fields=['resource', 'object_id'], name='searchentry_object_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.resource}:{self.object_id} {self.term}'
@@ -0,0 +1,125 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+from . import serializers
+
+
+HEARTBEAT_SECONDS = 15
+# Django 4.2 dưới ASGI không báo cho generator khi client ngắt kết nối: mỗi luồng SSE chỉ sống tối đa
+# STREAM_MAX_SECONDS rồi tự đóng, EventSource của trình duyệt kết nối lại sau RETRY_MILLISECONDS
+STREAM_MAX_SECONDS = 5 * 60
+RETRY_MILLISECONDS = 3000
+
+
+class InProcessBroker:
+    # Broker trong tiến trình: mỗi kết nối SSE là một asyncio.Queue gắn với event loop của nó.
+    # publish() an toàn khi gọi từ thread khác (view đồng bộ, signal).
+    queue_size = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, channel):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers[channel].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, channel, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is None:
+                return
+            subscribers.difference_update({s for s in subscribers if s[1] is queue})
+            if not subscribers:
+                del self._subscribers[channel]
+
+    def publish(self, channel, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, event)
+            except RuntimeError:
+                # event loop đã đóng
+                self.unsubscribe(channel, queue)
+
+    @staticmethod
+    def _put(queue, event):
+        if queue.full():
+            # Client đọc chậm: bỏ sự kiện cũ nhất
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+
+class LocalBroker(InProcessBroker):
+    # Dùng trong test: ghi lại mọi sự kiện đã publish
+    def __init__(self):
+        super().__init__()
+        self.published = []
+
+    def publish(self, channel, event):
+        self.published.append((channel, event))
+        super().publish(channel, event)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'COURSES_NOTIFICATION_BROKER', 'courses.notifications.InProcessBroker')
+                _broker = import_string(path)()
+    return _broker
+
+
+def set_broker(broker):
+    global _broker
+    _broker = broker
+
+
+def tudo_channel(tudo_id):
+    return f'tudo:{tudo_id}'
+
+
+def notify_packages(event_type, packages):
+    broker = get_broker()
+    for package in packages:
+        broker.publish(tudo_channel(package.tuDo_id), {
+            'type': event_type,
+            'package': serializers.PackageSerializer(package).data,
+        })
+
+
+async def event_stream(broker, channel, heartbeat=HEARTBEAT_SECONDS, max_age=STREAM_MAX_SECONDS):
+    # Luồng Server-Sent Events; gửi ": ping" định kỳ để proxy không cắt kết nối đang rảnh,
+    # đóng sau max_age giây (xem STREAM_MAX_SECONDS)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_age
+    queue = broker.subscribe(channel)
+    try:
+        yield f'retry: {RETRY_MILLISECONDS}\n: connected\n\n'
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                event = await asyncio.wait_for(queue.get(), min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                if loop.time() < deadline:
+                    yield ': ping\n\n'
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event, cls=DjangoJSONEncoder, ensure_ascii=False)}\n\n"
+    finally:
+        broker.unsubscribe(channel, queue)
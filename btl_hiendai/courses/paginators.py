@@ -1,13 +1,64 @@
 from rest_framework import pagination
 
 
-class PaymentPaginator(pagination.PageNumberPagination):
+class PageNumberPaginator(pagination.PageNumberPagination):
     page_size = 5
+    page_size_query_param = 'page_size'
+    max_page_size = 100
 
 
-class PackagePaginator(pagination.PageNumberPagination):
+class KeysetPaginator(pagination.CursorPagination):
+    # Mặc định phân trang theo số trang (?page=...) như cũ.
+    # Truyền ?pagination=cursor (hoặc ?cursor=...) để dùng phân trang theo cursor: không COUNT(*), không OFFSET lớn;
+    # link next/previous giữ nguyên chế độ cursor.
     page_size = 5
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-id',)
+    page_number_class = PageNumberPaginator
+    mode_query_param = 'pagination'
 
+    def use_cursor(self, request):
+        return (self.cursor_query_param in request.query_params
+                or request.query_params.get(self.mode_query_param) == 'cursor')
 
-class TuDoPaginator(pagination.PageNumberPagination):
-    page_size = 5
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_number_paginator = None
+        if not self.use_cursor(request):
+            self.page_number_paginator = self.page_number_class()
+            self.page_number_paginator.page_size = self.page_size
+            self.page_number_paginator.max_page_size = self.max_page_size
+            return self.page_number_paginator.paginate_queryset(queryset.order_by(*self.ordering), request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_html_context(self):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.get_html_context()
+        return super().get_html_context()
+
+    def to_html(self):
+        if self.page_number_paginator is not None:
+            return self.page_number_paginator.to_html()
+        return super().to_html()
+
+
+class PaymentPaginator(KeysetPaginator):
+    ordering = ('-payment_date', '-id')
+
+
+class BillPaginator(KeysetPaginator):
+    # Cursor chỉ định vị theo trường đầu tiên: nhiều hóa đơn cùng bill_date sẽ phải quét lại từ đầu ngày đó
+    ordering = ('-id',)
+
+
+class PackagePaginator(KeysetPaginator):
+    ordering = ('-id',)
+
+
+class TuDoPaginator(KeysetPaginator):
+    ordering = ('id',)
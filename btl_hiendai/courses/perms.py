@@ -3,7 +3,7 @@ from rest_framework import permissions
 
 class PaymentOwner(permissions.IsAuthenticated):
     def has_object_permission(self, request, view, payment):
-        return super().has_permission(request, view) and request.user == payment.user
+        return super().has_permission(request, view) and (request.user.is_superuser or request.user.pk == payment.user_id)
         # if not request.user.is_authenticated:
         #     return False
         # return request.user == obj.user
@@ -0,0 +1,140 @@
+import logging
+import re
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .metrics import wrap_connections
+
+logger = logging.getLogger(__name__)
+
+# Phát hiện N+1 và truy vấn chậm (bật bằng COURSES_QUERY_DETECTOR = True).
+# Trong một request, câu SQL cùng mẫu (cùng câu lệnh, khác tham số) lặp lại từ THRESHOLD lần trở lên
+# thì ghi log mẫu SQL đầu tiên vượt ngưỡng, số lần lặp và stack Python nơi gọi.
+# Chế độ strict (dùng trong test) raise RepeatedQueryError thay vì chỉ ghi log.
+
+_in_list_re = re.compile(r'\((?:%s, )+%s\)')
+
+
+def get_setting(name, default):
+    return getattr(settings, f'COURSES_QUERY_DETECTOR_{name}', default)
+
+
+class RepeatedQueryError(Exception):
+    pass
+
+
+def sql_template(sql):
+    # IN (%s, %s, ...) có số tham số khác nhau vẫn tính là một mẫu
+    return _in_list_re.sub('(%s, ...)', sql)
+
+
+def call_site(limit=15):
+    # Chỉ giữ các frame trong mã nguồn dự án (bỏ Django, DRF, site-packages)
+    base_dir = str(settings.BASE_DIR)
+    frames = [frame for frame in traceback.extract_stack()[:-3]
+              if frame.filename.startswith(base_dir) and 'site-packages' not in frame.filename
+              and frame.filename != __file__]
+    return ''.join(traceback.format_list(frames[-limit:]))
+
+
+class QueryDetector:
+    def __init__(self, threshold, strict=False, slow_seconds=None, label=''):
+        self.threshold = threshold
+        self.strict = strict
+        self.slow_seconds = slow_seconds
+        self.label = label
+        self.counts = Counter()
+        self.stacks = {}
+        # các mẫu SQL theo thứ tự vượt ngưỡng
+        self.offenders = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            template = sql_template(sql)
+            self.counts[template] += 1
+            count = self.counts[template]
+            if count == 2:
+                # lần lặp đầu tiên: lưu nơi gọi
+                self.stacks[template] = call_site()
+            if count == self.threshold:
+                self.offenders.append(template)
+            if self.slow_seconds is not None and duration >= self.slow_seconds:
+                logger.warning('Truy vấn chậm (%.3fs) trong %s: %s\n%s', duration, self.label, sql, call_site())
+
+    def report(self):
+        if not self.offenders:
+            return
+        template = self.offenders[0]
+        message = 'N+1: câu SQL lặp %d lần trong %s: %s\nNơi gọi:\n%s' % (
+            self.counts[template], self.label, template, self.stacks.get(template, ''))
+        others = [f'{self.counts[t]}x {t[:200]}' for t in self.offenders[1:]]
+        if others:
+            message += 'Các câu lặp khác:\n' + '\n'.join(others)
+        if self.strict:
+            raise RepeatedQueryError(message)
+        logger.warning(message)
+
+
+def make_detector(threshold=None, strict=None, slow_seconds=None, label=''):
+    return QueryDetector(
+        threshold or get_setting('THRESHOLD', 5),
+        get_setting('STRICT', False) if strict is None else strict,
+        get_setting('SLOW_SECONDS', None) if slow_seconds is None else slow_seconds,
+        label)
+
+
+@contextmanager
+def detect_queries(threshold=None, strict=None, slow_seconds=None, label=''):
+    detector = make_detector(threshold, strict, slow_seconds, label)
+    with wrap_connections(detector):
+        yield detector
+    detector.report()
+
+
+class QueryDetectorMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'COURSES_QUERY_DETECTOR', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with detect_queries(label=f'{request.method} {request.path}') as detector:
+            response = self.get_response(request)
+            self.add_view_name(request, detector)
+        return response
+
+    async def __acall__(self, request):
+        # Giống MetricsMiddleware: gắn detector ở thread mà ORM chạy (sync_to_async, thread_sensitive)
+        detector = make_detector(label=f'{request.method} {request.path}')
+        stack = await sync_to_async(wrap_connections)(detector)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.add_view_name(request, detector)
+        detector.report()
+        return response
+
+    @staticmethod
+    def add_view_name(request, detector):
+        match = getattr(request, 'resolver_match', None)
+        if match is not None:
+            detector.label += f' ({match.view_name})'
@@ -0,0 +1,107 @@
+import html
+import re
+import unicodedata
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+from ckeditor.fields import RichTextField
+from django.db.models import Case, IntegerField, Max, Q, Sum, When
+from django.utils.html import strip_tags
+
+from .models import Feedback, Package, SearchEntry, Service
+
+# Tìm kiếm toàn văn dùng bảng SearchEntry (chạy được trên cả MySQL và SQLite).
+# Văn bản được chuẩn hóa: bỏ thẻ HTML (RichTextField), bỏ dấu tiếng Việt, chữ thường.
+# Truy vấn khớp theo tiền tố của từ bằng điều kiện khoảng (term >= 'abc' AND term < 'abc' + '\uffff')
+# thay vì LIKE để dùng được index trên mọi CSDL.
+
+TERM_MAX_LENGTH = 50
+MAX_QUERY_TERMS = 10
+PREFIX_END = '\uffff'
+
+# resource -> (model, {trường: trọng số})
+RESOURCES = {
+    'package': (Package, {'name': 1}),
+    'feedback': (Feedback, {'subject': 3, 'message': 1}),
+    'service': (Service, {'name': 3, 'nameService': 1}),
+}
+MODEL_RESOURCES = {model: resource for resource, (model, _) in RESOURCES.items()}
+
+_word_re = re.compile(r'\w+')
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text.replace('đ', 'd').replace('Đ', 'D'))
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def terms(text):
+    return [word[:TERM_MAX_LENGTH] for word in _word_re.findall(normalize(text))]
+
+
+def field_text(obj, name):
+    value = getattr(obj, name) or ''
+    if isinstance(obj._meta.get_field(name), RichTextField):
+        value = html.unescape(strip_tags(value))
+    return value
+
+
+def build_entries(resource, obj, entry_model=SearchEntry):
+    weights = Counter()
+    for name, weight in RESOURCES[resource][1].items():
+        for term in terms(field_text(obj, name)):
+            weights[term] += weight
+    return [entry_model(resource=resource, object_id=obj.pk, term=term, weight=weight)
+            for term, weight in weights.items()]
+
+
+def index_objects(resource, objects):
+    objects = list(objects)
+    remove_objects(resource, [obj.pk for obj in objects])
+    SearchEntry.objects.bulk_create([entry for obj in objects for entry in build_entries(resource, obj)],
+                                    batch_size=1000)
+
+
+def remove_objects(resource, ids):
+    SearchEntry.objects.filter(resource=resource, object_id__in=ids).delete()
+
+
+def rebuild_index(resources=None, batch_size=1000):
+    counts = {}
+    for resource in resources or RESOURCES:
+        model = RESOURCES[resource][0]
+        SearchEntry.objects.filter(resource=resource).delete()
+        batch, counts[resource] = [], 0
+        for obj in model.objects.order_by('pk').iterator(chunk_size=batch_size):
+            batch.extend(build_entries(resource, obj))
+            counts[resource] += 1
+            if len(batch) >= batch_size:
+                SearchEntry.objects.bulk_create(batch)
+                batch = []
+        SearchEntry.objects.bulk_create(batch)
+    return counts
+
+
+def query_terms(q):
+    return list(dict.fromkeys(terms(q or '')))[:MAX_QUERY_TERMS]
+
+
+def ranked(resources, q):
+    # (resource, object_id, score) khớp với mọi từ trong q, điểm cao trước; từ khớp nguyên vẹn được cộng điểm
+    words = query_terms(q)
+    if not words:
+        return SearchEntry.objects.none().values('resource', 'object_id')
+    conditions = [Q(term__gte=word, term__lt=word + PREFIX_END) for word in words]
+    matches = {f'match_{i}': Max(Case(When(condition, then=1), default=0, output_field=IntegerField()))
+               for i, condition in enumerate(conditions)}
+    return SearchEntry.objects.filter(reduce(or_, conditions), resource__in=resources) \
+        .values('resource', 'object_id') \
+        .annotate(score=Sum('weight') + Sum(Case(When(term__in=words, then='weight'), default=0,
+                                                 output_field=IntegerField())), **matches) \
+        .filter(**{name: 1 for name in matches}) \
+        .order_by('-score', 'resource', '-object_id')
+
+
+def matching_ids(resource, q):
+    return ranked([resource], q).order_by().values_list('object_id', flat=True)
@@ -1,20 +1,36 @@
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
 from rest_framework import serializers
 from .models import User, Service, Bill, Payment, ResidentFamily, AccessCard, TuDo, Package, Feedback, SurveyForm, \
-    SurveyQuestion, SurveyResponse
+    SurveyQuestion, SurveyResponse, RevenueRollup
+from . import uploads
+from .fieldsets import SparseFieldsMixin
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    avatar_thumbnail = serializers.CharField(source='avatar_thumbnail_url', read_only=True)
+
     def create(self, validated_data):
         data = validated_data.copy()
+        avatar = data.get('avatar')
+        if isinstance(avatar, UploadedFile):
+            # Avatar được tải lên Cloudinary ở worker nền (uploads.py)
+            data.pop('avatar')
         user = User(**data)
         user.set_password(user.password)
-        user.save()
+        with transaction.atomic():
+            user.save()
+            if isinstance(avatar, UploadedFile):
+                uploads.enqueue_upload(user, 'avatar', avatar)
 
         return user
 
     class Meta:
         model = User
-        fields = ['id', 'first_name', 'last_name', 'email', 'username', 'password', 'avatar', 'role', 'is_active']
+        fields = ['id', 'first_name', 'last_name', 'email', 'username', 'password', 'avatar', 'role', 'is_active',
+                  'avatar_thumbnail']
+        # to_representation đọc thêm avatar_url khi trả trường avatar
+        field_dependencies = {'avatar': ['avatar_url']}
         extra_kwargs = {
             'password': {
                 'write_only': 'true'
@@ -23,31 +39,38 @@ class UserSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         # để hiển thị dường dân tuyệt đối của ảnh trên swagger
+        # URL đã được tính sẵn khi lưu ảnh (images.py), không build lại cho từng dòng
         rep = super().to_representation(instance)
-        avatar = instance.avatar
-        if avatar:
-            rep['avatar'] = avatar.url
+        if 'avatar' in rep:
+            avatar_url = instance.avatar_url
+            if not avatar_url and instance.avatar:
+                avatar_url = instance.avatar.url
+            if avatar_url:
+                rep['avatar'] = avatar_url
         return rep
 
 
-class ServiceSerializer(serializers.ModelSerializer):
+class ServiceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Service
         fields = ['id', 'name', 'nameService', 'priceService']
 
 
-class BillSerializer(serializers.ModelSerializer):
+class BillSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Bill
-        fields = ['id', 'name', 'bill_date', 'created_date', 'service']
+        fields = ['id', 'name', 'bill_date', 'created_date', 'service', 'total_amount']
+        read_only_fields = ['total_amount']
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     # user = UserSerializer()
     # services = ServiceSerializer(many=True)
     class Meta:
         model = Payment
-        fields = ['id', 'bill', 'status', 'amount', 'payment_image', 'created_date', 'transaction_id', 'user']
+        fields = ['id', 'bill', 'status', 'amount', 'payment_image', 'payment_image_url',
+                  'payment_image_thumbnail_url', 'created_date', 'transaction_id', 'user', 'upload_status']
+        read_only_fields = ['payment_image_url', 'payment_image_thumbnail_url', 'upload_status']
 
     # def to_representation(self, instance):
     #     # để hiển thị dường dân tuyệt đối của ảnh trên swagger
@@ -58,43 +81,73 @@ class PaymentSerializer(serializers.ModelSerializer):
     #     return rep
 
 
-class ResidentFamilySerializer(serializers.ModelSerializer):
+class ResidentFamilySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ResidentFamily
         fields = ['id', 'name', 'cccd', 'sdt', 'created_date', 'active', 'user_id', 'status']
 
 
-class TuDoSerializer(serializers.ModelSerializer):
+class TuDoSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = TuDo
         fields = ['id', 'name', 'created_date', 'active']
 
 
-class PackageSerializer(serializers.ModelSerializer):
+class PackageSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Package
         fields = ['id', 'name', 'tuDo', 'status']
 
 
-class FeedbackSerializer(serializers.ModelSerializer):
+class PackageBulkItemSerializer(serializers.Serializer):
+    tuDo = serializers.IntegerField()
+    name = serializers.CharField(max_length=50)
+
+
+class PackageStatusBulkSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=1000)
+    status = serializers.ChoiceField(choices=Package.STATUS_CHOICES, default='received')
+    from_status = serializers.ChoiceField(choices=Package.STATUS_CHOICES, default='waiting')
+
+
+class FeedbackSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Feedback
         fields = ['id', 'subject', 'message', 'user']
 
 
-class SurveyFormSerializer(serializers.ModelSerializer):
+class SurveyFormSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = SurveyForm
         fields = ['id', 'user', 'title', 'description', 'is_active']
 
 
-class SurveyQuestionSerializer(serializers.ModelSerializer):
+class SurveyQuestionSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = SurveyQuestion
         fields = ['surveyForm', 'text']
 
 
-class SurveyResponseSerializer(serializers.ModelSerializer):
+class SurveyAnswerSerializer(serializers.Serializer):
+    text = serializers.CharField()
+
+
+class SurveyQuestionWithAnswersSerializer(serializers.Serializer):
+    text = serializers.CharField()
+    answers = SurveyAnswerSerializer(many=True, allow_empty=False)
+
+
+class SurveyQuestionsWithAnswersSerializer(serializers.Serializer):
+    questions = SurveyQuestionWithAnswersSerializer(many=True, allow_empty=False)
+
+
+class SurveyResponseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = SurveyResponse
         fields = ['id', 'answer']
+
+
+class RevenueRollupSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = RevenueRollup
+        fields = ['id', 'month', 'service', 'payment_method', 'payment_count', 'paid_count', 'total', 'paid_total']
@@ -0,0 +1,250 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_save, pre_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from oauth2_provider.models import get_access_token_model, get_application_model
+
+from . import cache, conditional, sync, notifications, images, authentication, search, stats
+from .models import Bill, Service, SurveyResponse, Package, Payment, TuDo, ResidentFamily, User, Feedback
+from .surveys import record_answers
+
+
+@receiver(m2m_changed, sender=Bill.service.through)
+def bill_services_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # bill.service.add/remove/clear(...)
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Bill.refresh_totals(Bill.objects.filter(pk=instance.pk))
+            cache.invalidate_bills([instance.pk])
+            stats.mark_payments_dirty(Payment.objects.filter(bill=instance))
+        return
+
+    # service.hoa_don.add/remove/clear(...)
+    if action == 'pre_clear':
+        instance._cleared_bill_ids = list(instance.hoa_don.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        bill_ids = getattr(instance, '_cleared_bill_ids', [])
+        Bill.refresh_totals(Bill.objects.filter(pk__in=bill_ids))
+        cache.invalidate_bills(bill_ids)
+        stats.mark_payments_dirty(Payment.objects.filter(bill__in=bill_ids))
+    elif action in ('post_add', 'post_remove') and pk_set:
+        Bill.refresh_totals(Bill.objects.filter(pk__in=pk_set))
+        cache.invalidate_bills(pk_set)
+        stats.mark_payments_dirty(Payment.objects.filter(bill__in=pk_set))
+
+
+@receiver(post_delete, sender=Bill)
+def bill_deleted(sender, instance, **kwargs):
+    cache.invalidate_bills([instance.pk])
+
+
+@receiver(pre_save, sender=Bill)
+def bill_payment_method_tracker(sender, instance, **kwargs):
+    old_method = None
+    if instance.pk:
+        old_method = Bill.objects.filter(pk=instance.pk).values_list('payment_method', flat=True).first()
+    instance._old_payment_method = old_method
+
+
+@receiver(post_save, sender=Bill)
+def bill_payment_method_changed(sender, instance, created, **kwargs):
+    if created or instance._old_payment_method == instance.payment_method:
+        return
+    stats.mark_payments_dirty(Payment.objects.filter(bill=instance))
+
+
+# Giá trị cũ mà các receiver post_save cần so sánh: phạm vi đồng bộ (sync.RESOURCES), trạng thái món hàng,
+# giá dịch vụ và các trường được đánh chỉ mục tìm kiếm (search.RESOURCES)
+TRACKED_FIELDS = {
+    Package: ['tuDo_id', 'status', 'name'],
+    Payment: ['user_id'],
+    ResidentFamily: ['user_id'],
+    Feedback: ['subject', 'message'],
+    Service: ['priceService', 'name', 'nameService'],
+}
+
+
+@receiver(pre_save, sender=Package)
+@receiver(pre_save, sender=Payment)
+@receiver(pre_save, sender=ResidentFamily)
+@receiver(pre_save, sender=Feedback)
+@receiver(pre_save, sender=Service)
+def old_values_tracker(sender, instance, update_fields=None, **kwargs):
+    # Một câu truy vấn cho mọi trường cần theo dõi; save(update_fields) chỉ đọc các trường được ghi.
+    # _old_values = None khi object chưa có trong DB
+    fields = TRACKED_FIELDS[sender]
+    if update_fields is not None:
+        updated = {sender._meta.get_field(name).attname for name in update_fields}
+        fields = [f for f in fields if f in updated]
+    old = None
+    if instance.pk is not None:
+        old = sender.objects.filter(pk=instance.pk).values(*fields).first() if fields else {}
+    instance._old_values = old
+
+
+def old_value(instance, field):
+    # Trường không được đọc lại (không nằm trong update_fields) coi như không đổi
+    old = getattr(instance, '_old_values', None)
+    if old is None:
+        return None
+    return old.get(field, getattr(instance, field))
+
+
+def changed(instance, fields):
+    if getattr(instance, '_old_values', None) is None:
+        return True
+    return any(old_value(instance, f) != getattr(instance, f) for f in fields)
+
+
+@receiver(post_save, sender=Service)
+def service_price_changed(sender, instance, created, **kwargs):
+    cache.invalidate_services()
+    if created or not changed(instance, ['priceService']):
+        return
+    Bill.refresh_totals(Bill.objects.filter(service=instance))
+    stats.mark_payments_dirty(Payment.objects.filter(bill__service=instance))
+
+
+@receiver(pre_delete, sender=Service)
+def service_deleting(sender, instance, **kwargs):
+    instance._deleted_bill_ids = list(instance.hoa_don.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Service)
+def service_deleted(sender, instance, **kwargs):
+    Bill.refresh_totals(Bill.objects.filter(pk__in=getattr(instance, '_deleted_bill_ids', [])))
+    cache.invalidate_services()
+
+
+@receiver(pre_save, sender=SurveyResponse)
+def survey_response_tracker(sender, instance, **kwargs):
+    old = None
+    if instance.pk:
+        old = SurveyResponse.objects.filter(pk=instance.pk).first()
+    instance._old_response = old
+
+
+@receiver(post_save, sender=SurveyResponse)
+def survey_response_saved(sender, instance, created, **kwargs):
+    old = instance._old_response
+    if old is not None:
+        if (old.surveyQuestion_id, old.answer) == (instance.surveyQuestion_id, instance.answer):
+            return
+        record_answers([old], delta=-1)
+    record_answers([instance])
+
+
+@receiver(post_delete, sender=SurveyResponse)
+def survey_response_deleted(sender, instance, **kwargs):
+    record_answers([instance], delta=-1)
+
+
+@receiver(post_save, sender=Package)
+@receiver(post_delete, sender=Package)
+def package_changed(sender, **kwargs):
+    conditional.bump('package')
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def payment_changed(sender, **kwargs):
+    conditional.bump('payment')
+
+
+@receiver(post_delete, sender=Payment)
+def payment_deleted(sender, instance, **kwargs):
+    if instance.payment_date:
+        stats.mark_months_dirty([stats.month_of(instance.payment_date)])
+
+
+@receiver(post_save, sender=TuDo)
+@receiver(post_delete, sender=TuDo)
+def tudo_changed(sender, **kwargs):
+    conditional.bump('tudo')
+
+
+@receiver(post_save, sender=Package)
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=ResidentFamily)
+def sync_object_saved(sender, instance, **kwargs):
+    resource = sender._meta.model_name
+    scope_field = sync.RESOURCES[resource][3]
+    if getattr(instance, '_old_values', None) is not None and changed(instance, [scope_field]):
+        # Đổi tủ đồ / chủ sở hữu: phạm vi cũ nhận tombstone
+        old_scope = sync.make_scope(resource, old_value(instance, scope_field))
+        sync.record_changes(resource, [instance], action='delete', scope=old_scope)
+    sync.record_changes(resource, [instance])
+
+
+@receiver(post_delete, sender=Package)
+@receiver(post_delete, sender=Payment)
+@receiver(post_delete, sender=ResidentFamily)
+def sync_object_deleted(sender, instance, **kwargs):
+    sync.record_changes(sender._meta.model_name, [instance], action='delete')
+
+
+@receiver(post_save, sender=Package)
+def package_notify(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: notifications.notify_packages('package_created', [instance]))
+    elif instance.status == 'received' and old_value(instance, 'status') != 'received':
+        transaction.on_commit(lambda: notifications.notify_packages('package_received', [instance]))
+
+
+IMAGE_FIELDS = {User: 'avatar', Payment: 'payment_image'}
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=Payment)
+def image_urls_before_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and IMAGE_FIELDS[sender] not in update_fields:
+        return
+    images.sync_image_urls(instance, IMAGE_FIELDS[sender])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Payment)
+def image_urls_after_save(sender, instance, update_fields=None, **kwargs):
+    # Ảnh tải lên trực tiếp (vd. từ trang admin) chỉ có URL sau khi CloudinaryField.pre_save chạy
+    if update_fields is not None and IMAGE_FIELDS[sender] not in update_fields:
+        return
+    changed = images.sync_image_urls(instance, IMAGE_FIELDS[sender])
+    if changed:
+        sender.objects.filter(pk=instance.pk).update(**changed)
+
+
+@receiver(post_save, sender=get_access_token_model())
+@receiver(post_delete, sender=get_access_token_model())
+def access_token_changed(sender, instance, **kwargs):
+    # AccessToken.revoke() xóa token; đổi hạn/scope thì lưu lại
+    authentication.get_token_cache().evict(instance.token)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def token_user_changed(sender, instance, **kwargs):
+    authentication.get_token_cache().evict_where('user_id', instance.pk)
+
+
+@receiver(post_save, sender=get_application_model())
+@receiver(post_delete, sender=get_application_model())
+def token_application_changed(sender, instance, **kwargs):
+    authentication.get_token_cache().evict_where('application_id', instance.pk)
+
+
+@receiver(post_save, sender=Package)
+@receiver(post_save, sender=Feedback)
+@receiver(post_save, sender=Service)
+def search_object_saved(sender, instance, **kwargs):
+    resource = search.MODEL_RESOURCES[sender]
+    # Chỉ đánh chỉ mục lại khi trường được tìm kiếm thay đổi (đổi trạng thái món hàng không cần)
+    if not changed(instance, search.RESOURCES[resource][1]):
+        return
+    search.index_objects(resource, [instance])
+
+
+@receiver(post_delete, sender=Package)
+@receiver(post_delete, sender=Feedback)
+@receiver(post_delete, sender=Service)
+def search_object_deleted(sender, instance, **kwargs):
+    search.remove_objects(search.MODEL_RESOURCES[sender], [instance.pk])
@@ -0,0 +1,167 @@
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum, Q, DateField, Value
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from .models import Payment, RevenueRollup, RollupWatermark, PaymentRollup, RollupDirtyMonth
+
+ROLLUP_WATERMARK = 'revenue_rollup'
+
+
+def _rows(queryset, key):
+    return [{'label': r[key] if r[key] is not None else '', 'count': r['count'], 'total': float(r['total'] or 0)}
+            for r in queryset]
+
+
+def payment_stats(queryset=None):
+    # Số liệu trực tiếp cho trang thống kê: mọi số liệu đều được GROUP BY trong DB,
+    # số câu truy vấn cố định, không phụ thuộc số dòng
+    if queryset is None:
+        queryset = Payment.objects.all()
+
+    paid_count = queryset.aggregate(paid=Count('id', filter=Q(status='pass')))['paid']
+
+    by_month = queryset.annotate(month=TruncMonth('payment_date')).values('month') \
+        .annotate(count=Count('id', distinct=True), total=Sum('amount')).order_by('month')
+    by_method = queryset.values('bill__payment_method') \
+        .annotate(count=Count('id', distinct=True), total=Sum('amount')).order_by('bill__payment_method')
+    by_status = queryset.values('status') \
+        .annotate(count=Count('id', distinct=True), total=Sum('amount')).order_by('status')
+    by_service = queryset.filter(bill__service__isnull=False) \
+        .values('bill__service__id', 'bill__service__name') \
+        .annotate(count=Count('id'), total=Sum('bill__service__priceService')).order_by('bill__service__id')
+
+    return {
+        'paid_count': paid_count,
+        'by_month': [{'label': r['month'].strftime('%Y-%m') if r['month'] else '', 'count': r['count'],
+                      'total': float(r['total'] or 0)} for r in by_month],
+        'by_payment_method': _rows(by_method, 'bill__payment_method'),
+        'by_status': _rows(by_status, 'status'),
+        'by_service': _rows(by_service, 'bill__service__name'),
+    }
+
+
+def _next_month(month):
+    return (month.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
+
+def _month_start(month):
+    start = datetime.datetime.combine(month, datetime.time.min)
+    return timezone.make_aware(start) if settings.USE_TZ else start
+
+
+def payment_months(queryset):
+    return queryset.annotate(month=TruncMonth('payment_date', output_field=DateField())) \
+        .values_list('month', flat=True).distinct()
+
+
+def mark_months_dirty(months):
+    RollupDirtyMonth.objects.bulk_create([RollupDirtyMonth(month=month) for month in set(months) if month],
+                                         ignore_conflicts=True)
+
+
+def mark_payments_dirty(queryset):
+    # Xóa thanh toán, đổi dịch vụ/giá dịch vụ/phương thức của hóa đơn không làm đổi Payment.update_date
+    # nên các tháng liên quan được đánh dấu để lần chạy sau tính lại
+    mark_months_dirty(payment_months(queryset))
+
+
+def month_of(value):
+    if settings.USE_TZ:
+        value = timezone.localtime(value)
+    return value.date().replace(day=1)
+
+
+# Tính lại RevenueRollup/PaymentRollup cho các tháng có Payment thay đổi kể từ lần chạy trước
+# và các tháng được đánh dấu trong RollupDirtyMonth, trả về danh sách các tháng đã được tính lại
+def refresh_revenue_rollup(full=False):
+    watermark, _ = RollupWatermark.objects.get_or_create(name=ROLLUP_WATERMARK)
+    started = timezone.localdate()
+    dirty = dict(RollupDirtyMonth.objects.values_list('pk', 'month'))
+
+    if full or watermark.last_run is None:
+        months = list(payment_months(Payment.objects.all()))
+    else:
+        # update_date chỉ lưu ngày nên lấy cả ngày của lần chạy trước
+        months = list(payment_months(Payment.objects.filter(update_date__gte=watermark.last_run)))
+    # tháng được đánh dấu có thể không còn thanh toán nào: chỉ cần xóa dòng cũ
+    months = sorted(set(months) | set(dirty.values()))
+
+    with transaction.atomic():
+        rollups, payment_rollups = RevenueRollup.objects.all(), PaymentRollup.objects.all()
+        if not full:
+            rollups = rollups.filter(month__in=months)
+            payment_rollups = payment_rollups.filter(month__in=months)
+        rollups.delete()
+        payment_rollups.delete()
+
+        for month in months:
+            payments = Payment.objects.filter(payment_date__gte=_month_start(month),
+                                              payment_date__lt=_month_start(_next_month(month)))
+            counts = payments.values(method=Coalesce('bill__payment_method', Value(''))) \
+                .annotate(payment_count=Count('id'), paid_count=Count('id', filter=Q(status='pass'))) \
+                .order_by()
+            PaymentRollup.objects.bulk_create([
+                PaymentRollup(month=month, payment_method=r['method'], payment_count=r['payment_count'],
+                              paid_count=r['paid_count'])
+                for r in counts
+            ])
+
+            rows = payments.filter(bill__service__isnull=False) \
+                .values('bill__service', 'bill__payment_method') \
+                .annotate(payment_count=Count('id'),
+                          paid_count=Count('id', filter=Q(status='pass')),
+                          total=Sum('bill__service__priceService'),
+                          paid_total=Sum('bill__service__priceService', filter=Q(status='pass'))) \
+                .order_by()
+            RevenueRollup.objects.bulk_create([
+                RevenueRollup(month=month, service_id=r['bill__service'], payment_method=r['bill__payment_method'],
+                              payment_count=r['payment_count'], paid_count=r['paid_count'],
+                              total=r['total'] or 0, paid_total=r['paid_total'] or 0)
+                for r in rows
+            ])
+
+        RollupDirtyMonth.objects.filter(pk__in=dirty).delete()
+        watermark.last_run = started
+        watermark.save(update_fields=['last_run'])
+    return months
+
+
+def _merge(counts, totals, key):
+    # số thanh toán lấy từ PaymentRollup (đếm một lần), tổng tiền lấy từ RevenueRollup (theo dịch vụ)
+    totals = {r[key]: r['total'] for r in totals}
+    return [{key: r[key], 'count': r['count'], 'total': totals.get(r[key])} for r in counts]
+
+
+def rollup_stats(queryset=None, payment_queryset=None):
+    # Số liệu báo cáo đọc từ bảng RevenueRollup/PaymentRollup thay vì quét Payment x Bill.service,
+    # trang thống kê admin vẫn dùng payment_stats để có số liệu trực tiếp
+    if queryset is None:
+        queryset = RevenueRollup.objects.all()
+    if payment_queryset is None:
+        payment_queryset = PaymentRollup.objects.all()
+
+    totals = Sum('total')
+    counts = Sum('payment_count')
+    by_month = _merge(payment_queryset.values('month').annotate(count=counts).order_by('month'),
+                      queryset.values('month').annotate(total=totals).order_by(), 'month')
+    by_method = _merge(payment_queryset.values('payment_method').annotate(count=counts).order_by('payment_method'),
+                       queryset.values('payment_method').annotate(total=totals).order_by(), 'payment_method')
+    by_service = queryset.values('service__name').annotate(count=counts, total=totals) \
+        .order_by('service__name')
+    status = payment_queryset.aggregate(count=counts, paid_count=Sum('paid_count'))
+    status.update(queryset.aggregate(total=totals, paid_total=Sum('paid_total')))
+
+    count, paid_count = status['count'] or 0, status['paid_count'] or 0
+    total, paid_total = status['total'] or 0, status['paid_total'] or 0
+    return {
+        'by_month': [{'label': r['month'].strftime('%Y-%m'), 'count': r['count'], 'total': float(r['total'] or 0)}
+                     for r in by_month],
+        'by_payment_method': _rows(by_method, 'payment_method'),
+        'by_status': [{'label': 'pass', 'count': paid_count, 'total': float(paid_total)},
+                      {'label': 'pending', 'count': count - paid_count, 'total': float(total - paid_total)}],
+        'by_service': _rows(by_service, 'service__name'),
+    }
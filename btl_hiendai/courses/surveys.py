@@ -0,0 +1,67 @@
+import hashlib
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import SurveyAnswerCount, SurveyQuestion, SurveyResponse
+
+
+def answer_hash(answer):
+    return hashlib.sha1(answer.encode('utf-8')).hexdigest()
+
+
+def record_answers(responses, delta=1):
+    # Cộng (delta=1) hoặc trừ (delta=-1) bộ đếm cho danh sách SurveyResponse
+    counts = Counter()
+    for r in responses:
+        counts[(r.surveyForm_id, r.surveyQuestion_id, r.answer)] += delta
+    if not counts:
+        return
+
+    with transaction.atomic():
+        if delta > 0:
+            SurveyAnswerCount.objects.bulk_create([
+                SurveyAnswerCount(surveyForm_id=form_id, surveyQuestion_id=question_id, answer=answer,
+                                  answer_hash=answer_hash(answer), count=0)
+                for form_id, question_id, answer in counts
+            ], ignore_conflicts=True)
+
+        # Gom các câu trả lời có cùng delta theo câu hỏi để chỉ chạy vài câu UPDATE
+        groups = defaultdict(list)
+        for (form_id, question_id, answer), n in counts.items():
+            groups[(question_id, n)].append(answer_hash(answer))
+        for (question_id, n), hashes in groups.items():
+            SurveyAnswerCount.objects.filter(surveyQuestion_id=question_id, answer_hash__in=hashes) \
+                .update(count=F('count') + n)
+
+
+def rebuild_answer_counts(survey_form=None):
+    responses = SurveyResponse.objects.all()
+    counters = SurveyAnswerCount.objects.all()
+    if survey_form is not None:
+        responses = responses.filter(surveyForm=survey_form)
+        counters = counters.filter(surveyForm=survey_form)
+
+    rows = responses.values('surveyForm_id', 'surveyQuestion_id', 'answer').annotate(count=Count('id')).order_by()
+    with transaction.atomic():
+        counters.delete()
+        SurveyAnswerCount.objects.bulk_create([
+            SurveyAnswerCount(surveyForm_id=r['surveyForm_id'], surveyQuestion_id=r['surveyQuestion_id'],
+                              answer=r['answer'], answer_hash=answer_hash(r['answer']), count=r['count'])
+            for r in rows.iterator()
+        ], batch_size=1000)
+
+
+def survey_results(survey_form):
+    # Hai câu truy vấn: danh sách câu hỏi và bảng đếm, không quét SurveyResponse
+    questions = {q.pk: {'id': q.pk, 'text': q.text, 'total': 0, 'answers': []}
+                 for q in SurveyQuestion.objects.filter(surveyForm=survey_form).order_by('id')}
+    counters = SurveyAnswerCount.objects.filter(surveyForm=survey_form, count__gt=0) \
+        .order_by('surveyQuestion_id', '-count', 'answer').values_list('surveyQuestion_id', 'answer', 'count')
+    for question_id, answer, count in counters:
+        question = questions.get(question_id)
+        if question is not None:
+            question['answers'].append({'answer': answer, 'count': count})
+            question['total'] += count
+    return list(questions.values())
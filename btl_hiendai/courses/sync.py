@@ -0,0 +1,76 @@
+import datetime
+
+from django.utils import timezone
+
+from . import serializers
+from .models import ChangeLog, Package, Payment, ResidentFamily
+
+SYNC_LIMIT = 500
+SYNC_MAX_LIMIT = 1000
+# id của ChangeLog được cấp lúc INSERT chứ không phải lúc COMMIT: transaction cấp id nhỏ hơn có thể commit sau
+# khi client đã nhận token lớn hơn. Chỉ trả các dòng cũ hơn SYNC_LAG để transaction đang chạy kịp commit
+# (transaction kéo dài hơn SYNC_LAG vẫn có thể bị bỏ sót).
+SYNC_LAG = datetime.timedelta(seconds=2)
+
+# resource -> (model, serializer, tiền tố scope, field tạo scope)
+RESOURCES = {
+    'package': (Package, serializers.PackageSerializer, 'tudo', 'tuDo_id'),
+    'payment': (Payment, serializers.PaymentSerializer, 'user', 'user_id'),
+    'residentfamily': (ResidentFamily, serializers.ResidentFamilySerializer, 'user', 'user_id'),
+}
+
+
+def make_scope(resource, value):
+    return f'{RESOURCES[resource][2]}:{value}'
+
+
+def scope_of(resource, obj):
+    return make_scope(resource, getattr(obj, RESOURCES[resource][3]))
+
+
+def record_changes(resource, objects, action='upsert', scope=None):
+    # scope: ghi vào phạm vi cũ (vd. món hàng chuyển sang tủ đồ khác) thay vì phạm vi hiện tại của object
+    ChangeLog.objects.bulk_create([
+        ChangeLog(resource=resource, object_id=obj.pk, action=action, scope=scope or scope_of(resource, obj))
+        for obj in objects
+    ])
+
+
+def user_scopes(user):
+    scopes = [f'user:{user.pk}']
+    if user.tuDo_id:
+        scopes.append(f'tudo:{user.tuDo_id}')
+    return scopes
+
+
+def changes_since(user, since=0, limit=SYNC_LIMIT, lag=SYNC_LAG):
+    logs = ChangeLog.objects.filter(id__gt=since, created_at__lte=timezone.now() - lag)
+    if not user.is_superuser:
+        logs = logs.filter(scope__in=user_scopes(user))
+    logs = list(logs.order_by('id').values_list('id', 'resource', 'object_id', 'action')[:limit + 1])
+    has_more = len(logs) > limit
+    logs = logs[:limit]
+
+    # Chỉ giữ thay đổi cuối cùng của mỗi object
+    latest = {}
+    for log_id, resource, object_id, action in logs:
+        latest[(resource, object_id)] = action
+
+    result = {}
+    for resource, (model, serializer_class, _, _) in RESOURCES.items():
+        upsert_ids = [pk for (r, pk), action in latest.items() if r == resource and action == 'upsert']
+        deleted = [pk for (r, pk), action in latest.items() if r == resource and action == 'delete']
+        objects = list(model.objects.filter(pk__in=upsert_ids)) if upsert_ids else []
+        # object đã bị xóa sau khi ghi log mà log xóa nằm ngoài trang này: coi như tombstone
+        found = {obj.pk for obj in objects}
+        deleted += [pk for pk in upsert_ids if pk not in found]
+        result[resource] = {
+            'upserted': serializer_class(objects, many=True).data,
+            'deleted': sorted(deleted),
+        }
+
+    return {
+        'next': logs[-1][0] if logs else since,
+        'has_more': has_more,
+        'changes': result,
+    }
@@ -1,3 +1,1171 @@
-from django.test import TestCase
+import copy
+import csv
+import datetime
+import json
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from oauth2_provider.models import get_access_token_model, get_application_model
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from . import views, search, stats, sync, uploads, conditional, metrics, notifications, exports, cache, \
+    images, serializers, fastserializers, authentication, paginators
+from .querydetector import RepeatedQueryError, detect_queries
+from .models import User, Payment, TuDo, Service, Bill, Package, ResidentFamily, Feedback, SurveyForm, \
+    SurveyQuestion, SurveyResponse, ChangeLog, SearchEntry
+from .surveys import rebuild_answer_counts
+from .urls import r as router
+
+
+class BillTotalTests(TestCase):
+    def setUp(self):
+        self.water = Service.objects.create(name='nuoc', nameService='Nước', priceService=100)
+        self.power = Service.objects.create(name='dien', nameService='Điện', priceService=50)
+        self.bill = Bill.objects.create(name='hd 1')
+
+    def total(self):
+        return Bill.objects.get(pk=self.bill.pk).total_amount
+
+    def test_total_follows_services_and_prices(self):
+        self.bill.service.add(self.water, self.power)
+        self.assertEqual(self.total(), 150)
+        self.power.priceService = 70
+        self.power.save()
+        self.assertEqual(self.total(), 170)
+        self.water.hoa_don.remove(self.bill)
+        self.assertEqual(self.total(), 70)
+        self.power.delete()
+        self.assertEqual(self.total(), 0)
+
+    def test_reverse_clear(self):
+        self.bill.service.add(self.water)
+        self.water.hoa_don.clear()
+        self.assertEqual(self.total(), 0)
+
+    def test_rebuild_command(self):
+        self.bill.service.add(self.water, self.power)
+        Bill.objects.update(total_amount=0)
+        call_command('rebuild_bill_totals', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.total(), 150)
+
+
+class QueryIndexTests(TestCase):
+    # Chạy EXPLAIN trên đúng queryset mà view tạo ra và kiểm tra có dùng index
+    factory = APIRequestFactory()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='resident', password='123')
+        cls.tudo = TuDo.objects.create(name='tu 1')
+
+    def build_queryset(self, viewset, url, user=None):
+        request = Request(self.factory.get(url))
+        request.user = user or self.user
+        view = viewset(request=request, action='list', kwargs={}, format_kwarg=None)
+        return view.get_queryset()
+
+    def build_payment_queryset(self, url, user=None):
+        # Thứ tự sắp xếp do PaymentPaginator thêm vào khi phân trang
+        queryset = self.build_queryset(views.PaymentViewSet, url, user)
+        return queryset.order_by(*paginators.PaymentPaginator.ordering)
+
+    def plan_tables(self, node):
+        # Các bảng trong EXPLAIN FORMAT=JSON của MySQL (có thể nằm trong nested_loop/ordering_operation)
+        if isinstance(node, list):
+            return [t for item in node for t in self.plan_tables(item)]
+        if not isinstance(node, dict):
+            return []
+        tables = [node['table']] if 'table' in node else []
+        return tables + [t for key, value in node.items() if key != 'table' for t in self.plan_tables(value)]
+
+    def assertUsesIndex(self, queryset, index=None):
+        table = queryset.model._meta.db_table
+        if connection.vendor == 'sqlite':
+            plan = queryset.explain()
+            self.assertNotRegex(plan, r'SCAN %s(?! USING)' % re.escape(table), plan)
+            self.assertIn('INDEX', plan, plan)
+            if index:
+                self.assertRegex(plan, r'%s USING (COVERING )?INDEX %s\b' % (re.escape(table), index), plan)
+        elif connection.vendor == 'mysql':
+            plan = json.loads(queryset.explain(format='json'))
+            entry = next(t for t in self.plan_tables(plan['query_block']) if t['table_name'] == table)
+            self.assertNotEqual(entry['access_type'], 'ALL', plan)
+            self.assertTrue(entry.get('key'), plan)
+            if index:
+                self.assertEqual(entry['key'], index, plan)
+        else:
+            self.skipTest('EXPLAIN chỉ được kiểm tra trên sqlite/mysql')
+
+    def test_payment_list_by_status(self):
+        admin = User.objects.create_superuser(username='admin', password='123')
+        queryset = self.build_payment_queryset('/payments/?status=pass', admin)
+        self.assertUsesIndex(queryset, 'payment_status_active_idx')
+
+    def test_payment_list_per_user(self):
+        self.assertUsesIndex(self.build_payment_queryset('/payments/'), 'payment_user_date_idx')
+
+    def test_package_list(self):
+        self.assertUsesIndex(self.build_queryset(views.PackageViewSet, '/packages/?tuDo=%s&q=abc' % self.tudo.pk))
+
+    def test_tudo_packages_by_status(self):
+        self.assertUsesIndex(self.tudo.package.filter(status='received'))
+
+    def test_access_card(self):
+        self.assertUsesIndex(self.user.resident_families.filter(active=True))
+
+
+class RevenueRollupTests(TestCase):
+    def setUp(self):
+        self.water = Service.objects.create(name='nuoc', nameService='<p>Nước</p>', priceService=100)
+        self.power = Service.objects.create(name='dien', nameService='<p>Điện</p>', priceService=50)
+        self.bill = Bill.objects.create(name='hd 1', payment_method='momo')
+        self.bill.service.add(self.water, self.power)
+        other = Bill.objects.create(name='hd 2', payment_method='vnpay')
+        other.service.add(self.water)
+        self.paid = Payment.objects.create(bill=self.bill, amount=150, status='pass')
+        self.pending = Payment.objects.create(bill=other, amount=100)
+        stats.refresh_revenue_rollup(full=True)
+        # thanh toán không đổi từ hôm qua: chỉ tháng được đánh dấu mới được tính lại
+        Payment.objects.update(update_date=datetime.date.today() - datetime.timedelta(days=1))
+        self.assertEqual(stats.refresh_revenue_rollup(), [])
+
+    def test_counts_each_payment_once(self):
+        result = stats.rollup_stats()
+        self.assertEqual([(r['count'], r['total']) for r in result['by_month']], [(2, 250.0)])
+        self.assertEqual(result['by_status'], [{'label': 'pass', 'count': 1, 'total': 150.0},
+                                               {'label': 'pending', 'count': 1, 'total': 100.0}])
+        self.assertEqual(result['by_payment_method'], [{'label': 'momo', 'count': 1, 'total': 150.0},
+                                                       {'label': 'vnpay', 'count': 1, 'total': 100.0}])
+        self.assertEqual({r['label']: r['count'] for r in result['by_service']}, {'nuoc': 2, 'dien': 1})
+
+    def test_deleted_payment_marks_month(self):
+        self.pending.delete()
+        self.assertEqual(len(stats.refresh_revenue_rollup()), 1)
+        self.assertEqual([(r['count'], r['total']) for r in stats.rollup_stats()['by_month']], [(1, 150.0)])
+
+    def test_service_price_and_bill_services_mark_month(self):
+        self.power.priceService = 70
+        self.power.save()
+        self.assertEqual(len(stats.refresh_revenue_rollup()), 1)
+        self.assertEqual(stats.rollup_stats()['by_month'][0]['total'], 270.0)
+
+        self.bill.service.remove(self.power)
+        self.assertEqual(len(stats.refresh_revenue_rollup()), 1)
+        self.assertEqual(stats.rollup_stats()['by_month'][0]['total'], 200.0)
+
+    def test_bill_payment_method_marks_month(self):
+        self.bill.payment_method = 'vnpay'
+        self.bill.save()
+        stats.refresh_revenue_rollup()
+        self.assertEqual(stats.rollup_stats()['by_payment_method'], [{'label': 'vnpay', 'count': 2, 'total': 250.0}])
+
+    def test_rollup_endpoint_filters(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser(username='admin', password='123'))
+        url = reverse('revenue-rollups-list')
+        year = self.paid.payment_date.year
+        rows = client.get(url, {'year': year, 'service': self.water.pk}).json()
+        self.assertEqual({r['payment_method'] for r in rows}, {'momo', 'vnpay'})
+        self.assertEqual(client.get(url, {'year': 'abc'}).status_code, 400)
+        self.assertEqual(client.get(url, {'service': 'abc'}).status_code, 400)
+
+    def test_live_stats_and_admin_page(self):
+        # payment_stats đọc trực tiếp từ Payment, không cần refresh_revenue_rollup
+        Payment.objects.create(bill=self.bill, amount=30, status='pass')
+        result = stats.payment_stats()
+        self.assertEqual(result['paid_count'], 2)
+        self.assertEqual([(r['count'], r['total']) for r in result['by_month']], [(3, 280.0)])
+        self.assertEqual(result['by_payment_method'], [{'label': 'momo', 'count': 2, 'total': 180.0},
+                                                       {'label': 'vnpay', 'count': 1, 'total': 100.0}])
+        self.assertEqual({r['label']: r['count'] for r in result['by_service']}, {'nuoc': 3, 'dien': 2})
+
+        self.client.force_login(User.objects.create_superuser(username='admin', password='123'))
+        response = self.client.get('/admin/course-stats/')
+        self.assertEqual(response.context['stats'], result)
+        self.assertEqual(response.context['total_paid_invoices'], 2)
+
+
+class ImageUrlTests(TestCase):
+    def test_urls_follow_image_field(self):
+        payment = Payment.objects.create(amount=100, payment_image='image/upload/v1/bills/abc.jpg')
+        payment.refresh_from_db()
+        url, thumbnail = images.image_urls(payment.payment_image)
+        self.assertEqual((payment.payment_image_url, payment.payment_image_thumbnail_url), (url, thumbnail))
+        self.assertIn('bills/abc', url)
+        self.assertIn('c_fill,h_150,w_150', thumbnail)
+
+        payment.payment_image = None
+        payment.save()
+        payment.refresh_from_db()
+        self.assertEqual((payment.payment_image_url, payment.payment_image_thumbnail_url), (None, None))
+
+    def test_serializer_reads_stored_url(self):
+        user = User.objects.create_user(username='resident', password='123', avatar='image/upload/v1/avatars/a.png')
+        User.objects.filter(pk=user.pk).update(avatar_url='https://cdn.example.com/a.png',
+                                               avatar_thumbnail_url='https://cdn.example.com/a-150.png')
+        data = serializers.UserSerializer(User.objects.get(pk=user.pk)).data
+        self.assertEqual((data['avatar'], data['avatar_thumbnail']),
+                         ('https://cdn.example.com/a.png', 'https://cdn.example.com/a-150.png'))
+
+
+class UploadQueueTests(TestCase):
+    def setUp(self):
+        spool = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool, ignore_errors=True)
+        settings_override = override_settings(COURSES_UPLOAD_SPOOL_DIR=spool)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.backend = uploads.FakeUploadBackend()
+        self.queue = uploads.UploadQueue(self.backend, workers=0, max_attempts=2, retry_delay=0)
+        uploads.set_queue(self.queue)
+        self.addCleanup(uploads.set_queue, None)
+        self.user = User.objects.create_user(username='resident', password='123')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.payment = Payment.objects.create(user=self.user, amount=100)
+
+    def enqueue(self):
+        image = SimpleUploadedFile('bill.jpg', b'image', content_type='image/jpeg')
+        with self.captureOnCommitCallbacks(execute=True):
+            return uploads.enqueue_upload(self.payment, 'payment_image', image)
+
+    def test_upload_saves_image_and_records_change(self):
+        version = conditional.current(['payment']).get('payment', (0, None))[0]
+        path = self.enqueue()
+
+        payment = Payment.objects.get(pk=self.payment.pk)
+        self.assertEqual(payment.upload_status, 'done')
+        self.assertEqual(payment.payment_image.public_id, 'fake/' + os.path.splitext(os.path.basename(path))[0])
+        self.assertTrue(payment.payment_image_url)
+        self.assertEqual(self.backend.uploaded, [path])
+        self.assertFalse(os.path.exists(path))
+        self.assertGreater(conditional.current(['payment'])['payment'][0], version)
+        self.assertTrue(ChangeLog.objects.filter(resource='payment', object_id=payment.pk).exists())
+
+    def test_failed_upload_keeps_file(self):
+        self.backend.upload = lambda path, field: 1 / 0
+        with self.assertLogs('courses.uploads', 'WARNING') as logs:
+            path = self.enqueue()
+        self.assertEqual(len(logs.output), 2)
+
+        payment = Payment.objects.get(pk=self.payment.pk)
+        self.assertEqual((payment.upload_status, payment.upload_attempts), ('failed', 2))
+        self.assertTrue(os.path.exists(path))
+
+    def test_invalid_spool_file_is_skipped(self):
+        path = os.path.join(uploads.spool_dir(), 'ghi-chu.txt')
+        with open(path, 'w') as f:
+            f.write('x')
+        with self.assertLogs('courses.uploads', 'ERROR'):
+            self.assertFalse(self.queue.process(path))
+        out = StringIO()
+        call_command('process_uploads', stdout=out, stderr=StringIO())
+        self.assertIn('bỏ qua 1', out.getvalue())
+        self.assertEqual(self.backend.uploaded, [])
+
+
+class PaymentViewSetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='123')
+        cls.resident = User.objects.create_user(username='resident', password='123')
+        cls.payment = Payment.objects.create(user=cls.resident, amount=100)
+        Payment.objects.create(user=cls.admin, amount=50)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_filter_by_user(self):
+        response = self.client.get(reverse('payments-list'), {'user': self.resident.pk})
+        self.assertEqual([p['id'] for p in response.json()['results']], [self.payment.pk])
+
+    def test_invalid_user_returns_400(self):
+        response = self.client.get(reverse('payments-list'), {'user': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('user', response.json())
+
+
+class ServiceCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.water = Service.objects.create(name='nuoc', nameService='Nước', priceService=100)
+        cls.power = Service.objects.create(name='dien', nameService='Điện', priceService=50)
+        cls.bill = Bill.objects.create(name='hd 1')
+        cls.bill.service.add(cls.water)
+
+    def setUp(self):
+        cache.get_cache().clear()
+        cache.reset_stats()
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(url).json()
+        return data, len(queries)
+
+    def test_catalog_is_cached_until_services_change(self):
+        url = reverse('services-list')
+        data, _ = self.get(url)
+        self.assertEqual(self.get(url), (data, 0))
+        self.assertEqual(self.get(url + '?fields=id')[0], [{'id': s['id']} for s in data])
+
+        self.power.priceService = 70
+        self.power.save()
+        data, queries = self.get(url)
+        self.assertGreater(queries, 0)
+        self.assertIn(70.0, [s['priceService'] for s in data])
+        self.assertEqual(cache.stats(), {'service_catalog.miss': 2, 'service_catalog.hit': 2})
+
+    def test_bill_services_invalidated_by_m2m_change(self):
+        url = reverse('bills-get-services', args=[self.bill.pk])
+        self.assertEqual([s['name'] for s in self.get(url)[0]], ['nuoc'])
+        self.assertEqual(self.get(url)[1], 0)
+        self.bill.service.add(self.power)
+        self.assertEqual(sorted(s['name'] for s in self.get(url)[0]), ['dien', 'nuoc'])
+
+
+class SparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='123')
+        cls.tudo = TuDo.objects.create(name='tu 1')
+        Payment.objects.create(user=cls.admin, amount=100, transaction_id='TX1')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_fields_narrow_payload_and_sql(self):
+        with CaptureQueriesContext(connection) as queries:
+            results = self.client.get(reverse('payments-list'), {'fields': 'id,status,bogus'}).json()['results']
+        self.assertEqual(list(results[0]), ['id', 'status'])
+        table = 'FROM ' + connection.ops.quote_name(Payment._meta.db_table)
+        sql = next(q['sql'] for q in queries if table in q['sql'])
+        self.assertNotIn('transaction_id', sql)
+        self.assertNotIn('payment_image_url', sql)
+
+    def test_exclude(self):
+        results = self.client.get(reverse('payments-list'), {'exclude': 'payment_image,user'}).json()['results']
+        self.assertNotIn('payment_image', results[0])
+        self.assertNotIn('user', results[0])
+        self.assertEqual(results[0]['transaction_id'], 'TX1')
+
+    def test_serializer_arguments(self):
+        package = Package.objects.create(name='Áo khoác', tuDo=self.tudo)
+        self.assertEqual(serializers.PackageSerializer(package, fields=['id', 'name']).data,
+                         {'id': package.pk, 'name': 'Áo khoác'})
+        self.assertNotIn('name', serializers.PackageSerializer(package, exclude=['name']).data)
+
+
+class FastSerializerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='resident', password='123')
+        tudo = TuDo.objects.create(name='tu 1')
+        Package.objects.create(name='Áo khoác', tuDo=tudo, status='received')
+        Payment.objects.create(user=user, amount='100.50', transaction_id='TX1', payment_image='image/upload/v1/a.jpg')
+        Payment.objects.create(amount=10)
+        Feedback.objects.create(user=user, subject='Thang máy', message='Hỏng')
+        form = SurveyForm.objects.create(title='Khảo sát', description='')
+        question = SurveyQuestion.objects.create(surveyForm=form, text='Vệ sinh?')
+        SurveyResponse.objects.create(surveyForm=form, surveyQuestion=question, answer='Tốt')
+
+    def test_values_path_matches_serializer(self):
+        renderer = JSONRenderer()
+        for serializer_class in (serializers.PackageSerializer, serializers.PaymentSerializer,
+                                 serializers.TuDoSerializer, serializers.FeedbackSerializer,
+                                 serializers.SurveyResponseSerializer):
+            queryset = serializer_class.Meta.model.objects.order_by('pk')
+            reader = fastserializers.get_reader(serializer_class())
+            self.assertIsNotNone(reader, serializer_class.__name__)
+            self.assertEqual(renderer.render(reader.data(reader.values(queryset))),
+                             renderer.render(serializer_class(queryset, many=True).data), serializer_class.__name__)
+
+    def test_custom_representation_uses_serializer(self):
+        self.assertIsNone(fastserializers.get_reader(serializers.UserSerializer()))
+
+    def test_list_endpoint_uses_values(self):
+        with CaptureQueriesContext(connection) as queries:
+            results = self.client.get(reverse('packages-list')).json()['results']
+        self.assertEqual(results, serializers.PackageSerializer(Package.objects.all(), many=True).data)
+        # ResourceVersion (ETag) + COUNT(*) của phân trang theo số trang + một câu SELECT .values()
+        self.assertEqual(len(queries), 3)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.resident = User.objects.create_user(username='resident', password='123')
+        cls.other = User.objects.create_user(username='other', password='123')
+        cls.payment = Payment.objects.create(user=cls.resident, amount=100)
+        cls.other_payment = Payment.objects.create(user=cls.other, amount=50)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.resident)
+
+    def test_list_etag(self):
+        url = reverse('payments-list')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # version chỉ tăng khi transaction commit
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(user=self.resident, amount=10)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_bump_once_per_transaction(self):
+        version = conditional.current(['payment']).get('payment', (0, None))[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as queries:
+                for amount in (10, 20, 30):
+                    Payment.objects.create(user=self.resident, amount=amount)
+            self.assertFalse([q for q in queries if 'resourceversion' in q['sql'].lower()])
+        self.assertEqual(conditional.current(['payment'])['payment'][0], version + 1)
+
+    def test_retrieve_checks_object_before_304(self):
+        url = reverse('payments-detail', args=[self.payment.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        for pk in (self.other_payment.pk, 0):
+            response = self.client.get(reverse('payments-detail', args=[pk]), HTTP_IF_NONE_MATCH='*')
+            self.assertEqual(response.status_code, 404)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.bills = Bill.objects.bulk_create(Bill(name=f'hd {i}') for i in range(12))
+
+    def test_cursor_walks_every_bill_once(self):
+        url, ids, pages = reverse('bills-list') + '?pagination=cursor&page_size=5', [], 0
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                data = self.client.get(url).json()
+            self.assertLessEqual(len(queries), 2)
+            ids += [bill['id'] for bill in data['results']]
+            url, pages = data['next'], pages + 1
+        self.assertEqual(pages, 3)
+        self.assertEqual(ids, sorted((bill.pk for bill in Bill.objects.all()), reverse=True))
+
+    def test_page_number_mode_is_default(self):
+        data = self.client.get(reverse('bills-list'), {'page_size': 5}).json()
+        self.assertEqual(data['count'], 12)
+        self.assertIn('page=2', data['next'])
+        data = self.client.get(data['next']).json()
+        self.assertEqual([bill['id'] for bill in data['results']],
+                         sorted((bill.pk for bill in Bill.objects.all()), reverse=True)[5:10])
+        self.assertNotIn('cursor', data['previous'])
+
+
+class SyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tudo, cls.other_tudo = TuDo.objects.create(name='tu 1'), TuDo.objects.create(name='tu 2')
+        cls.resident = User.objects.create_user(username='resident', password='123', tuDo=cls.tudo)
+        cls.neighbour = User.objects.create_user(username='neighbour', password='123', tuDo=cls.other_tudo)
+
+    def changes(self, user, since=0):
+        return sync.changes_since(user, since, lag=datetime.timedelta(0))
+
+    def test_token_and_scope(self):
+        package = Package.objects.create(name='thu', tuDo=self.tudo)
+        Payment.objects.create(user=self.neighbour, amount=10)
+        result = self.changes(self.resident)
+        self.assertEqual([p['id'] for p in result['changes']['package']['upserted']], [package.pk])
+        self.assertEqual(result['changes']['payment']['upserted'], [])
+
+        package_id = package.pk
+        package.delete()
+        result = self.changes(self.resident, result['next'])
+        self.assertEqual(result['changes']['package'], {'upserted': [], 'deleted': [package_id]})
+        self.assertEqual(self.changes(self.resident, result['next'])['next'], result['next'])
+
+    def test_recent_changes_wait_for_lag(self):
+        Package.objects.create(name='thu', tuDo=self.tudo)
+        result = sync.changes_since(self.resident, 0)
+        self.assertEqual((result['next'], result['changes']['package']['upserted']), (0, []))
+        ChangeLog.objects.update(created_at=timezone.now() - sync.SYNC_LAG)
+        self.assertEqual(len(sync.changes_since(self.resident, 0)['changes']['package']['upserted']), 1)
+
+    def test_moved_package_is_deleted_from_old_scope(self):
+        package = Package.objects.create(name='thu', tuDo=self.tudo)
+        since = self.changes(self.neighbour)['next']
+        package.tuDo = self.other_tudo
+        package.save()
+        self.assertEqual(self.changes(self.resident)['changes']['package']['deleted'], [package.pk])
+        upserted = self.changes(self.neighbour, since)['changes']['package']['upserted']
+        self.assertEqual([p['id'] for p in upserted], [package.pk])
+
+    def test_sync_endpoint_validates_params(self):
+        client = APIClient()
+        client.force_authenticate(self.resident)
+        self.assertEqual(client.get(reverse('sync-list'), {'since': 'x'}).status_code, 400)
+        self.assertEqual(client.get(reverse('sync-list')).json()['next'], 0)
+
+
+class SurveyFormTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.form = SurveyForm.objects.create(title='Khảo sát', description='Dịch vụ chung cư')
+
+    def post_questions(self, data):
+        return self.client.post(reverse('surveyforms-add-questions-with-answers', args=[self.form.pk]), data,
+                                content_type='application/json')
+
+    def test_add_questions_with_answers(self):
+        response = self.post_questions({'questions': [
+            {'text': 'Vệ sinh?', 'answers': [{'text': 'Tốt'}, {'text': 'Kém'}]},
+            {'text': 'An ninh?', 'answers': [{'text': 'Tốt'}]},
+        ]})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([q['text'] for q in response.json()], ['Vệ sinh?', 'An ninh?'])
+        self.assertEqual(SurveyResponse.objects.filter(surveyForm=self.form).count(), 3)
+
+    def test_invalid_body_returns_400(self):
+        for data in ([{'text': 'Vệ sinh?', 'answers': [{'text': 'Tốt'}]}], {'questions': []},
+                     {'questions': [{'text': 'Vệ sinh?', 'answers': []}]}, {}):
+            self.assertEqual(self.post_questions(data).status_code, 400, data)
+        response = self.client.post(reverse('surveyforms-add-question-with-answers', args=[self.form.pk]), [],
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(SurveyQuestion.objects.exists())
+
+    def test_results_follow_responses(self):
+        question = SurveyQuestion.objects.create(surveyForm=self.form, text='Vệ sinh?')
+        for answer in ('Tốt', 'Tốt', 'Kém', 'Tốt'):
+            SurveyResponse.objects.create(surveyForm=self.form, surveyQuestion=question, answer=answer)
+        changed = SurveyResponse.objects.filter(answer='Tốt').first()
+        changed.answer = 'Kém'
+        changed.save()
+        SurveyResponse.objects.filter(answer='Tốt').first().delete()
+
+        url = reverse('surveyforms-get-results', args=[self.form.pk])
+        with CaptureQueriesContext(connection) as queries:
+            results = self.client.get(url).json()
+        self.assertLessEqual(len(queries), 3)
+        self.assertEqual(results, [{'id': question.pk, 'text': 'Vệ sinh?', 'total': 3,
+                                    'answers': [{'answer': 'Kém', 'count': 2}, {'answer': 'Tốt', 'count': 1}]}])
+        rebuild_answer_counts(self.form)
+        self.assertEqual(self.client.get(url).json(), results)
+
+
+class PackageIntakeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='123')
+        cls.resident = User.objects.create_user(username='resident', password='123')
+        cls.tudo = TuDo.objects.create(name='tu 1')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.broker = notifications.LocalBroker()
+        notifications.set_broker(self.broker)
+        self.addCleanup(notifications.set_broker, None)
+
+    def bulk_add(self, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('tudos-bulk-add-packages'), data, format='json')
+
+    def test_bulk_add_reports_each_item(self):
+        response = self.bulk_add({'packages': [
+            {'tuDo': self.tudo.pk, 'name': 'Áo khoác'},
+            {'tuDo': 0, 'name': 'Giày'},
+            {'tuDo': self.tudo.pk},
+            {'tuDo': self.tudo.pk, 'name': 'Sách'},
+        ]})
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual((data['created'], data['failed']), (2, 2))
+        self.assertEqual([r['created'] for r in data['results']], [True, False, False, True])
+        self.assertIn('tuDo', data['results'][1]['errors'])
+        self.assertIn('name', data['results'][2]['errors'])
+
+        ids = sorted(Package.objects.filter(tuDo=self.tudo).values_list('pk', flat=True))
+        self.assertEqual(len(ids), 2)
+        self.assertEqual(sorted(ChangeLog.objects.filter(resource='package').values_list('object_id', flat=True)), ids)
+        self.assertEqual(list(search.matching_ids('package', 'ao khoac')), ids[:1])
+        self.assertEqual([event['type'] for _, event in self.broker.published], ['package_created'] * 2)
+
+    def test_bulk_add_without_returned_ids(self):
+        # giả lập MySQL: bulk_create không gán id cho các đối tượng
+        other = Package.objects.create(name='Giày', tuDo=self.tudo)
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            data = self.bulk_add([{'tuDo': self.tudo.pk, 'name': 'Giày'}, {'tuDo': self.tudo.pk, 'name': 'Áo'}]).json()
+
+        ids = [r['package']['id'] for r in data['results']]
+        self.assertNotIn(None, ids)
+        self.assertNotIn(other.pk, ids)
+        self.assertEqual(dict(Package.objects.filter(pk__in=ids).values_list('pk', 'name')),
+                         dict(zip(ids, ['Giày', 'Áo'])))
+        self.assertEqual(sorted(ChangeLog.objects.filter(resource='package').values_list('object_id', flat=True)),
+                         sorted([other.pk] + ids))
+        self.assertEqual([event['package']['id'] for _, event in self.broker.published][-2:], ids)
+
+    def test_bulk_add_rejects_bad_requests(self):
+        self.assertEqual(self.bulk_add({'packages': []}).status_code, 400)
+        self.assertEqual(self.bulk_add([{'tuDo': 0, 'name': 'Giày'}]).status_code, 400)
+        self.client.force_authenticate(self.resident)
+        self.assertEqual(self.bulk_add([{'tuDo': self.tudo.pk, 'name': 'Giày'}]).status_code, 403)
+        self.assertFalse(Package.objects.exists())
+
+    def test_bulk_status_change(self):
+        other_tudo = TuDo.objects.create(name='tu 2')
+        waiting = Package.objects.bulk_create(Package(name=f'mon {i}', tuDo=self.tudo) for i in range(2))
+        received = Package.objects.create(name='mon 3', tuDo=self.tudo, status='received')
+        elsewhere = Package.objects.create(name='mon 4', tuDo=other_tudo)
+        ids = [p.pk for p in waiting] + [received.pk, elsewhere.pk]
+        url = reverse('tudos-bulk-change-package-status', args=[self.tudo.pk])
+
+        response = self.client.patch(url, {'ids': ids}, format='json')
+        self.assertEqual(response.json(), {'changed': ids[:2], 'unchanged': ids[2:]})
+        self.assertEqual(Package.objects.filter(status='received').count(), 3)
+        self.assertEqual(Package.objects.get(pk=elsewhere.pk).status, 'waiting')
+        self.assertEqual([event['package']['id'] for _, event in self.broker.published], ids[:2])
+        self.assertEqual(ChangeLog.objects.filter(object_id__in=ids[:2], scope=f'tudo:{self.tudo.pk}').count(), 2)
+
+        self.assertEqual(self.client.patch(url, {'ids': ids, 'status': 'lost'}, format='json').status_code, 400)
+        self.assertEqual(self.client.patch(url, {'ids': []}, format='json').status_code, 400)
+
+    def test_bulk_status_change_rejects_bad_requests(self):
+        package = Package.objects.create(name='mon 1', tuDo=self.tudo)
+        url = reverse('tudos-bulk-change-package-status', args=[self.tudo.pk])
+        bad_url = reverse('tudos-bulk-change-package-status', args=['abc'])
+
+        self.assertEqual(self.client.patch(bad_url, {'ids': [package.pk]}, format='json').status_code, 404)
+        self.client.force_authenticate(self.resident)
+        self.assertEqual(self.client.patch(url, {'ids': [package.pk]}, format='json').status_code, 403)
+        self.client.force_authenticate(None)
+        self.assertIn(self.client.patch(url, {'ids': [package.pk]}, format='json').status_code, (401, 403))
+        self.assertEqual(Package.objects.get(pk=package.pk).status, 'waiting')
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='123')
+        service = Service.objects.create(name='nuoc', nameService='Nước', priceService=100)
+        cls.bills = Bill.objects.bulk_create(Bill(name=f'hd {i}') for i in range(5))
+        for bill in cls.bills:
+            bill.service.add(service)
+        Payment.objects.create(bill=cls.bills[0], amount=100, status='pass', transaction_id='TX1')
+        Payment.objects.create(bill=cls.bills[1], amount=100, transaction_id='TX2')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def export(self, name, **params):
+        response = self.client.get(reverse(f'{name}-export'), params)
+        return response, b''.join(response.streaming_content).decode('utf-8') if response.streaming else None
+
+    def test_bills_csv(self):
+        response, content = self.export('bills')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertFalse(response.is_async)
+        rows = list(csv.DictReader(StringIO(content)))
+        self.assertEqual([int(r['id']) for r in rows], [b.pk for b in self.bills])
+        self.assertEqual((rows[0]['total_amount'], rows[0]['services']), ('100.0', 'nuoc:100.0'))
+
+    def test_payments_ndjson_filtered(self):
+        response, content = self.export('payments', type='ndjson', status='pass')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([(r['transaction_id'], r['bill_total']) for r in rows], [('TX1', 100.0)])
+        self.assertEqual([(s['name'], s['price']) for s in rows[0]['services']], [('nuoc', 100.0)])
+
+    async def test_asgi_streams_batches(self):
+        # dưới ASGI mỗi lô được lấy qua sync_to_async thay vì gom cả iterator đồng bộ
+        application = await get_application_model().objects.acreate(
+            name='app', user=self.admin, client_type='confidential', authorization_grant_type='password')
+        token = await get_access_token_model().objects.acreate(
+            user=self.admin, application=application, token='export-token', scope='read write',
+            expires=timezone.now() + datetime.timedelta(hours=1))
+        with mock.patch.object(exports, 'EXPORT_BATCH_SIZE', 2):
+            response = await self.async_client.get(reverse('bills-export'), {'type': 'ndjson'},
+                                                   AUTHORIZATION=f'Bearer {token.token}')
+            self.assertTrue(response.is_async)
+            chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual([json.loads(chunk)['id'] for chunk in chunks], [b.pk for b in self.bills])
+
+    def test_batches_keep_query_count_per_batch(self):
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(exports.bill_rows())
+        self.assertEqual(len(rows), 5)
+        # một lô: bills + prefetch services + lô rỗng cuối cùng
+        self.assertEqual(len(queries), 3)
+        self.assertEqual([b.pk for b in exports.iter_batches(Bill.objects.all(), batch_size=2)],
+                         [b.pk for b in self.bills])
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.export('bills', type='xml')[0].status_code, 400)
+        self.client.force_authenticate(User.objects.create_user(username='resident', password='123'))
+        self.assertEqual(self.export('payments')[0].status_code, 403)
+
+
+class PackageEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tudo = TuDo.objects.create(name='tu 1')
+        cls.resident = User.objects.create_user(username='resident', password='123', tuDo=cls.tudo)
+
+    def setUp(self):
+        self.broker = notifications.LocalBroker()
+        notifications.set_broker(self.broker)
+        self.addCleanup(notifications.set_broker, None)
+
+    def test_signals_publish_created_and_received(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            package = Package.objects.create(name='Áo khoác', tuDo=self.tudo)
+        for name in ('Áo khoác đỏ', 'Áo khoác đỏ'):
+            package.name, package.status = name, 'received'
+            with self.captureOnCommitCallbacks(execute=True):
+                package.save()
+        self.assertEqual([(channel, event['type']) for channel, event in self.broker.published],
+                         [(f'tudo:{self.tudo.pk}', 'package_created'), (f'tudo:{self.tudo.pk}', 'package_received')])
+
+    async def test_event_stream(self):
+        stream = notifications.event_stream(self.broker, 'tudo:1', heartbeat=0.01)
+        self.assertEqual(await anext(stream), 'retry: 3000\n: connected\n\n')
+        self.assertEqual(await anext(stream), ': ping\n\n')
+        await sync_to_async(self.broker.publish, thread_sensitive=False)('tudo:1', {'type': 'package_created', 'id': 1})
+        self.assertEqual(await anext(stream), 'event: package_created\ndata: {"type": "package_created", "id": 1}\n\n')
+        await stream.aclose()
+        self.assertEqual(dict(self.broker._subscribers), {})
+
+    async def test_event_stream_closes_after_max_age(self):
+        # client ngắt kết nối không được báo về generator: luồng tự đóng và hủy đăng ký
+        stream = notifications.event_stream(self.broker, 'tudo:1', heartbeat=0.01, max_age=0.05)
+        chunks = [chunk async for chunk in stream]
+        self.assertEqual(chunks[0], 'retry: 3000\n: connected\n\n')
+        self.assertEqual(set(chunks[1:]), {': ping\n\n'})
+        self.assertEqual(dict(self.broker._subscribers), {})
+
+    async def test_endpoint(self):
+        url = reverse('package-events')
+        self.assertEqual((await self.async_client.get(url)).status_code, 401)
+        await sync_to_async(self.async_client.force_login)(self.resident)
+        response = await self.async_client.get(url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n: connected\n\n')
+        self.broker.publish(f'tudo:{self.tudo.pk}', {'type': 'package_received'})
+        self.assertTrue((await anext(stream)).startswith(b'event: package_received\n'))
+
+    def test_endpoint_requires_asgi(self):
+        self.client.force_login(self.resident)
+        self.assertEqual(self.client.get(reverse('package-events')).status_code, 501)
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', password='123')
+        cls.resident = User.objects.create_user(username='resident', password='123')
+        cls.tudo = TuDo.objects.create(name='tu 1')
+        cls.packages = Package.objects.bulk_create(Package(name=f'mon {i}', tuDo=cls.tudo) for i in range(5))
+        cls.payment = Payment.objects.create(user=cls.resident, amount=100)
+        cls.other_payment = Payment.objects.create(user=cls.admin, amount=50)
+
+    async def get(self, name, *args, **params):
+        response = await self.async_client.get(reverse(name, args=args), params)
+        return response.status_code, json.loads(response.content)
+
+    async def test_package_cursor_pages(self):
+        ids, url = [], reverse('async-packages-list') + '?page_size=2'
+        while url:
+            data = json.loads((await self.async_client.get(url)).content)
+            ids += [p['id'] for p in data['results']]
+            url = data['next']
+        self.assertEqual(ids, sorted((p.pk for p in self.packages), reverse=True))
+        self.assertEqual((await self.get('async-packages-detail', self.packages[0].pk))[1]['name'], 'mon 0')
+        self.assertEqual((await self.get('async-packages-detail', 0))[0], 404)
+
+    async def test_payments_are_scoped_to_user(self):
+        self.assertEqual((await self.get('async-payments-list'))[0], 401)
+        await sync_to_async(self.async_client.force_login)(self.resident)
+        self.assertEqual([p['id'] for p in (await self.get('async-payments-list'))[1]['results']], [self.payment.pk])
+        self.assertEqual((await self.get('async-payments-detail', self.other_payment.pk))[0], 404)
+
+        await sync_to_async(self.async_client.force_login)(self.admin)
+        status_code, data = await self.get('async-payments-list', user=self.resident.pk)
+        self.assertEqual([p['id'] for p in data['results']], [self.payment.pk])
+        self.assertEqual((await self.get('async-payments-list', user='abc'))[0], 400)
+
+    async def test_tudos_ascending(self):
+        await sync_to_async(TuDo.objects.create)(name='tu 2')
+        names = [t['name'] for t in (await self.get('async-tudos-list'))[1]['results']]
+        self.assertEqual(names, ['tu 1', 'tu 2'])
+
+
+class TokenCacheTests(TestCase):
+    factory = APIRequestFactory()
+
+    def setUp(self):
+        authentication.get_token_cache().clear()
+        self.user = User.objects.create_user(username='resident', password='123')
+        application = get_application_model().objects.create(
+            name='app', user=self.user, client_type='confidential', authorization_grant_type='password')
+        self.token = get_access_token_model().objects.create(
+            user=self.user, application=application, token='token-1', scope='read write',
+            expires=timezone.now() + datetime.timedelta(hours=1))
+
+    def authenticate(self):
+        request = Request(self.factory.get('/packages/', HTTP_AUTHORIZATION=f'Bearer {self.token.token}'))
+        return authentication.CachingOAuth2Authentication().authenticate(request)
+
+    def test_cached_token_skips_db(self):
+        self.assertEqual(self.authenticate()[0], self.user)
+        with CaptureQueriesContext(connection) as queries:
+            user, token = self.authenticate()
+        self.assertEqual((len(queries), user.pk, token.token), (0, self.user.pk, 'token-1'))
+        self.assertEqual(authentication.get_token_cache().stats(), {'size': 1, 'hits': 1, 'misses': 1})
+
+    def test_revoked_token_is_evicted(self):
+        self.authenticate()
+        self.token.revoke()
+        self.assertIsNone(self.authenticate())
+
+    def test_user_change_is_evicted(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(authentication.get_token_cache().stats()['size'], 0)
+
+    def test_expired_and_lru(self):
+        token_cache = authentication.TokenCache(maxsize=1, ttl=60)
+        token_cache.set(self.token)
+        self.assertIsNotNone(token_cache.get('token-1'))
+        other = copy.copy(self.token)
+        other.token = 'token-2'
+        token_cache.set(other)
+        self.assertIsNone(token_cache.get('token-1'))
+        other.expires = timezone.now() - datetime.timedelta(seconds=1)
+        token_cache.set(other)
+        self.assertIsNone(token_cache.get('token-2'))
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='resident', password='123')
+        cls.tudo = TuDo.objects.create(name='tu 1')
+        cls.package = Package.objects.create(name='Áo KHOÁC đỏ', tuDo=cls.tudo)
+        cls.title_hit = Feedback.objects.create(user=cls.user, subject='Thang máy hỏng', message='Tầng 5')
+        cls.body_hit = Feedback.objects.create(user=cls.user, subject='Góp ý', message='Thang máy chạy chậm')
+        cls.service = Service.objects.create(name='Điện', nameService='<p>Ti&ecirc;n &amp; s&aacute;ng</p>',
+                                             priceService=1)
+
+    def test_terms(self):
+        self.assertEqual(search.terms('Áo KHOÁC Đỏ, đỏ!'), ['ao', 'khoac', 'do', 'do'])
+        self.assertEqual(search.query_terms('do do ao'), ['do', 'ao'])
+        self.assertEqual(sorted(SearchEntry.objects.filter(resource='service').values_list('term', flat=True)),
+                         ['dien', 'sang', 'tien'])
+
+    def test_ranking_prefix_and_all_words(self):
+        ranked = list(search.ranked(['feedback'], 'thang may'))
+        self.assertEqual([r['object_id'] for r in ranked], [self.title_hit.pk, self.body_hit.pk])
+        self.assertEqual(list(search.matching_ids('package', 'kho ao')), [self.package.pk])
+        self.assertEqual(list(search.matching_ids('package', 'khoac xanh')), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.package.name = 'Giày'
+        self.package.save()
+        self.assertEqual(list(search.matching_ids('package', 'khoac')), [])
+        self.assertEqual(list(search.matching_ids('package', 'giay')), [self.package.pk])
+        self.package.delete()
+        self.assertFalse(SearchEntry.objects.filter(resource='package').exists())
+        self.assertEqual(search.rebuild_index(), {'package': 0, 'feedback': 2, 'service': 1})
+
+    def test_unchanged_fields_skip_reindex(self):
+        # đổi trạng thái món hàng: một câu đọc giá trị cũ, không ghi lại SearchEntry
+        self.package.status = 'received'
+        with CaptureQueriesContext(connection) as queries:
+            self.package.save()
+        self.assertFalse([q for q in queries if 'searchentry' in q['sql'].lower()])
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('SELECT')]), 1)
+
+        self.title_hit.message = 'Tầng 6'
+        with CaptureQueriesContext(connection) as queries:
+            self.title_hit.save(update_fields=['message'])
+        self.assertTrue([q for q in queries if 'searchentry' in q['sql'].lower()])
+        self.assertEqual(list(search.matching_ids('feedback', '6')), [self.title_hit.pk])
+
+    def test_endpoint(self):
+        response = self.client.get(reverse('search-list'), {'q': 'thang', 'type': 'feedback,bogus', 'limit': 1})
+        self.assertEqual([(r['type'], r['id']) for r in response.json()['results']], [('feedback', self.title_hit.pk)])
+        self.assertEqual(self.client.get(reverse('search-list'), {'q': '!!'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('search-list'), {'q': 'thang', 'limit': 'x'}).status_code, 400)
+
+
+class MetricsMiddlewareTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        TuDo.objects.bulk_create(TuDo(name=f'tu {i}') for i in range(3))
+
+    def setUp(self):
+        metrics.reset()
+
+    def view_stats(self, view):
+        return metrics.snapshot()[0][view, 'GET']
+
+    def test_sync_request(self):
+        self.client.get(reverse('tudos-list'))
+        stats = self.view_stats('tudos-list')
+        self.assertEqual(stats.count, 1)
+        self.assertGreater(stats.queries, 0)
+        self.assertIn('courses_http_responses_total{view="tudos-list",method="GET",status="200"} 1', metrics.render())
+
+    async def test_async_request(self):
+        await self.async_client.get(reverse('async-tudos-list'))
+        await self.async_client.get(reverse('tudos-list'))
+        for view in ('async-tudos-list', 'tudos-list'):
+            stats = self.view_stats(view)
+            self.assertEqual(stats.count, 1)
+            self.assertGreater(stats.queries, 0)
+
+
+class QueryDetectorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.tudo = TuDo.objects.create(name='tu 1')
+        Package.objects.bulk_create(Package(name=f'mon {i}', tuDo=cls.tudo) for i in range(10))
+
+    def test_repeated_query_raises_in_strict_mode(self):
+        with self.assertRaisesRegex(RepeatedQueryError, r'lặp 10 lần[\s\S]*courses/tests\.py'):
+            with detect_queries(threshold=5, strict=True, label='test'):
+                [package.tuDo.name for package in Package.objects.all()]
+
+    def test_repeated_query_is_logged(self):
+        with self.assertLogs('courses.querydetector', 'WARNING') as logs:
+            with detect_queries(threshold=5, strict=False, label='test'):
+                [package.tuDo.name for package in Package.objects.all()]
+        self.assertIn('N+1', logs.output[0])
+
+    def test_select_related_passes(self):
+        with detect_queries(threshold=2, strict=True, label='test'):
+            [package.tuDo.name for package in Package.objects.select_related('tuDo')]
+
+    @override_settings(COURSES_QUERY_DETECTOR=True, COURSES_QUERY_DETECTOR_THRESHOLD=1)
+    def test_middleware(self):
+        with self.assertLogs('courses.querydetector', 'WARNING') as logs:
+            self.client.get(reverse('tudos-list'))
+        self.assertIn('GET /tudos/ (tudos-list)', logs.output[0])
+
+    @override_settings(COURSES_QUERY_DETECTOR=True, COURSES_QUERY_DETECTOR_THRESHOLD=1)
+    async def test_async_middleware(self):
+        with self.assertLogs('courses.querydetector', 'WARNING') as logs:
+            await self.async_client.get(reverse('async-tudos-list'))
+        self.assertIn('(async-tudos-list)', logs.output[0])
+
+
+# Factory tạo dữ liệu số lượng lớn bằng bulk_create (không qua signal); bảng phụ được tính lại ở seed_dataset
+def make_users(n, password=make_password('123')):
+    return User.objects.bulk_create(
+        User(username=f'user{i}', password=password, first_name=f'Ten {i}', email=f'user{i}@example.com',
+             avatar_url=f'https://res.cloudinary.com/demo/image/upload/v1/avatar{i}.jpg')
+        for i in range(n))
+
+
+def make_tudos(n):
+    return TuDo.objects.bulk_create(TuDo(name=f'Tu do {i}') for i in range(n))
+
+
+def make_services(n):
+    return Service.objects.bulk_create(
+        Service(name=f'Dich vu {i}', nameService=f'<p>Dịch vụ {i}: giữ xe, điện nước &amp; vệ sinh</p>',
+                priceService=10000 * (i + 1))
+        for i in range(n))
+
+
+def make_bills(n, services, per_bill=3):
+    bills = Bill.objects.bulk_create(Bill(name=f'Hoa don {i}', payment_method=('momo', 'vnpay')[i % 2])
+                                     for i in range(n))
+    Bill.service.through.objects.bulk_create(
+        Bill.service.through(bill_id=bill.pk, service_id=services[(i + j) % len(services)].pk)
+        for i, bill in enumerate(bills) for j in range(per_bill))
+    return bills
+
+
+def make_payments(n, users, bills):
+    return Payment.objects.bulk_create(
+        Payment(user=users[i % len(users)], bill=bills[i % len(bills)], amount=100000 + i,
+                status=('pending', 'pass')[i % 2], transaction_id=f'TX{i}')
+        for i in range(n))
+
+
+def make_packages(n, tudos):
+    return Package.objects.bulk_create(
+        Package(name=f'{("Áo khoác", "Giày", "Sách")[i % 3]} {i}', tuDo=tudos[i % len(tudos)],
+                status=('waiting', 'received')[i // len(tudos) % 2])
+        for i in range(n))
+
+
+def make_resident_families(n, users):
+    return ResidentFamily.objects.bulk_create(
+        ResidentFamily(user=users[i % len(users)], name=f'Nguoi than {i}', cccd=f'{i:012d}', sdt=f'09{i:08d}')
+        for i in range(n))
+
+
+def make_feedbacks(n, users):
+    return Feedback.objects.bulk_create(
+        Feedback(user=users[i % len(users)], subject=f'Phản ánh {i}', message=f'Thang máy tầng {i % 20} bị hỏng')
+        for i in range(n))
+
+
+def make_survey_responses(n, user, forms=5, questions=4):
+    survey_forms = SurveyForm.objects.bulk_create(
+        SurveyForm(user=user, title=f'Khao sat {i}', description='Danh gia dich vu') for i in range(forms))
+    survey_questions = SurveyQuestion.objects.bulk_create(
+        SurveyQuestion(surveyForm=form, text=f'Cau hoi {j}') for form in survey_forms for j in range(questions))
+    SurveyResponse.objects.bulk_create(
+        SurveyResponse(surveyForm_id=survey_questions[i % len(survey_questions)].surveyForm_id,
+                       surveyQuestion=survey_questions[i % len(survey_questions)],
+                       answer=('Tot', 'Binh thuong', 'Kem')[i % 3])
+        for i in range(n))
+    return survey_forms
+
+
+def seed_dataset(scale=1):
+    users = make_users(1000 * scale)
+    tudos = make_tudos(200 * scale)
+    for user, tudo in zip(users, tudos):
+        user.tuDo = tudo
+    User.objects.bulk_update(users[:len(tudos)], ['tuDo'])
+    services = make_services(20)
+    bills = make_bills(500 * scale, services)
+    payments = make_payments(3000 * scale, users, bills)
+    packages = make_packages(3000 * scale, tudos)
+    make_resident_families(500 * scale, users)
+    make_feedbacks(500 * scale, users)
+    survey_forms = make_survey_responses(3000 * scale, users[0])
+
+    Bill.refresh_totals(Bill.objects.all())
+    rebuild_answer_counts()
+    search.rebuild_index()
+    stats.refresh_revenue_rollup(full=True)
+    sync.record_changes('package', packages[:500])
+    sync.record_changes('payment', payments[:500])
+    # ngoài khoảng sync.SYNC_LAG để /sync/ trả về các thay đổi này
+    ChangeLog.objects.update(created_at=timezone.now() - 2 * sync.SYNC_LAG)
+    return {'users': users[0], 'bills': bills[0], 'payments': payments[0], 'packages': packages[0],
+            'surveyforms': survey_forms[0], 'tudos': tudos[0]}
+
+
+@tag('benchmark')
+class EndpointBenchmarkTests(TestCase):
+    # Gọi mọi route GET đăng ký trên DefaultRouter (courses/urls.py) với bộ dữ liệu lớn, ghi lại số truy vấn,
+    # p50/p95 và kích thước response. Fail nếu số truy vấn tăng theo page size (N+1) hoặc vượt ngân sách.
+    # Chạy riêng: manage.py test courses --tag=benchmark; bỏ qua: --exclude-tag=benchmark
+    # COURSES_BENCHMARK_SCALE nhân số lượng dữ liệu, COURSES_BENCHMARK_RUNS là số lần đo mỗi route.
+    scale = int(os.environ.get('COURSES_BENCHMARK_SCALE', 1))
+    runs = int(os.environ.get('COURSES_BENCHMARK_RUNS', 5))
+    max_queries = 10
+    page_sizes = (1, 25)
+    # Tham số bắt buộc và tham số giới hạn số dòng của các route không dùng pagination_class
+    route_params = {'search-list': {'q': 'ao'}}
+    page_size_params = {'search-list': 'limit', 'sync-list': 'limit'}
+    results = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.detail_objects = seed_dataset(cls.scale)
+        cls.admin = User.objects.create_superuser(username='admin', password='123', email='admin@example.com')
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.results:
+            sys.stderr.write('\n%-40s %8s %10s %10s %10s\n' % ('route', 'queries', 'p50 (ms)', 'p95 (ms)', 'bytes'))
+            for name, row in sorted(cls.results.items()):
+                sys.stderr.write('%-40s %8d %10.1f %10.1f %10d\n' % (
+                    name, row['queries'], row['p50'] * 1000, row['p95'] * 1000, row['size']))
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_dataset_uses_valid_choices(self):
+        for model in (User, Bill, Payment, Package, ResidentFamily):
+            for field in model._meta.fields:
+                if field.choices:
+                    values = set(model.objects.values_list(field.name, flat=True).distinct())
+                    choices = {value for value, _ in field.choices}
+                    self.assertLessEqual(values, choices, f'{model.__name__}.{field.name}')
+
+    def get_routes(self):
+        # (tên route, url, viewset) của các route có GET
+        for pattern in router.urls:
+            actions = getattr(pattern.callback, 'actions', None)
+            if not actions or 'get' not in actions or '(?P<format>' in str(pattern.pattern):
+                continue
+            kwargs = {}
+            if 'detail' in pattern.name or '(?P<pk>' in str(pattern.pattern):
+                kwargs['pk'] = self.detail_objects[pattern.name.split('-')[0]].pk
+            yield pattern.name, reverse(pattern.name, kwargs=kwargs), pattern.callback.cls
+
+    def get(self, name, url, **params):
+        # strict: câu SQL lặp lại trong một request (N+1) làm test fail
+        with detect_queries(strict=True, label=name):
+            response = self.client.get(url, {**self.route_params.get(name, {}), **params})
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+        self.assertEqual(response.status_code, 200, f'{name}: {content[:500]!r}')
+        return content
+
+    def count_queries(self, name, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            self.get(name, url, **params)
+        return len(queries)
+
+    def test_routes(self):
+        for name, url, _ in self.get_routes():
+            with self.subTest(route=name):
+                self.get(name, url)  # làm nóng cache (danh mục dịch vụ, token...)
+                queries = self.count_queries(name, url)
+                latencies, size = [], 0
+                for _ in range(self.runs):
+                    started = time.perf_counter()
+                    size = len(self.get(name, url))
+                    latencies.append(time.perf_counter() - started)
+                latencies.sort()
+                self.results[name] = {
+                    'queries': queries, 'size': size, 'p50': statistics.median(latencies),
+                    'p95': latencies[max(0, int(len(latencies) * 0.95) - 1)],
+                }
+                self.assertLessEqual(queries, self.max_queries, f'{name}: {queries} truy vấn')
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        for name, url, viewset in self.get_routes():
+            param = self.page_size_params.get(name)
+            if param is None and getattr(viewset, 'pagination_class', None) is not None:
+                param = viewset.pagination_class.page_size_query_param
+            if param is None or not name.endswith('-list'):
+                continue
+            with self.subTest(route=name):
+                small, large = self.page_sizes
+                self.get(name, url, **{param: small})
+                counts = [self.count_queries(name, url, **{param: size}) for size in self.page_sizes]
+                self.assertEqual(counts[0], counts[1],
+                                 f'{name}: {counts[0]} truy vấn với {param}={small}, '
+                                 f'{counts[1]} truy vấn với {param}={large} (N+1?)')
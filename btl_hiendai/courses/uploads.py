@@ -0,0 +1,173 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from cloudinary import CloudinaryResource, uploader
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+
+from . import images
+
+logger = logging.getLogger(__name__)
+
+# Ảnh tải lên (ủy nhiệm chi, avatar) được ghi tạm ra đĩa, request trả về ngay,
+# worker chạy nền đẩy file lên Cloudinary rồi cập nhật bản ghi.
+# Tên file spool: <app_label>.<model>.<field>.<pk>.<uuid><ext> để có thể khôi phục hàng đợi sau khi khởi động lại.
+
+
+class CloudinaryUploadBackend:
+    def upload(self, path, field):
+        return uploader.upload_resource(path, type=field.type, resource_type=field.resource_type)
+
+
+class FakeUploadBackend:
+    # Dùng trong test: không gọi mạng, chỉ ghi lại các file đã "tải lên"
+    def __init__(self):
+        self.uploaded = []
+
+    def upload(self, path, field):
+        name, ext = os.path.splitext(os.path.basename(path))
+        self.uploaded.append(path)
+        return CloudinaryResource(public_id=f'fake/{name}', format=ext.lstrip('.') or None, version='1',
+                                  type=field.type, resource_type=field.resource_type)
+
+
+def get_setting(name, default):
+    return getattr(settings, f'COURSES_UPLOAD_{name}', default)
+
+
+def spool_dir():
+    path = str(get_setting('SPOOL_DIR', os.path.join(settings.BASE_DIR, 'upload_spool')))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def spool_file(instance, field_name, uploaded_file):
+    meta = instance._meta
+    ext = os.path.splitext(getattr(uploaded_file, 'name', '') or '')[1]
+    name = f'{meta.app_label}.{meta.model_name}.{field_name}.{instance.pk}.{uuid.uuid4().hex}{ext}'
+    path = os.path.join(spool_dir(), name)
+    with open(path + '.part', 'wb') as f:
+        for chunk in uploaded_file.chunks():
+            f.write(chunk)
+    os.replace(path + '.part', path)
+    return path
+
+
+def parse_spool_name(path):
+    # Tên file không đúng định dạng (file lạ trong thư mục spool) thì raise ValueError
+    try:
+        app_label, model_name, field_name, pk, _ = os.path.basename(path).split('.', 4)
+        model = apps.get_model(app_label, model_name)
+        model._meta.get_field(field_name)
+    except (ValueError, LookupError, FieldDoesNotExist) as e:
+        raise ValueError(f'File spool không hợp lệ: {path}') from e
+    return model, field_name, pk
+
+
+def save_fields(model, pk, **values):
+    # Dùng save(update_fields) thay vì .update() để post_save chạy (tăng phiên bản ETag, ghi ChangeLog cho /sync/)
+    instance = model.objects.filter(pk=pk).first()
+    if instance is None:
+        return None
+    for name, value in values.items():
+        setattr(instance, name, value)
+    instance.save(update_fields=list(values))
+    return instance
+
+
+class UploadQueue:
+    def __init__(self, backend, workers, max_attempts, retry_delay):
+        self.backend = backend
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='upload') if workers else None
+        self._active = set()
+        self._lock = threading.Lock()
+
+    def submit(self, path):
+        with self._lock:
+            if path in self._active:
+                return None
+            self._active.add(path)
+        if self.executor is None:
+            return self.process(path)
+        return self.executor.submit(self.process, path)
+
+    def process(self, path):
+        try:
+            try:
+                model, field_name, pk = parse_spool_name(path)
+            except ValueError as e:
+                logger.error('Bỏ qua %s', e)
+                return False
+            field = model._meta.get_field(field_name)
+            tracked = hasattr(model, 'upload_status')
+            for attempt in range(1, self.max_attempts + 1):
+                if tracked:
+                    save_fields(model, pk, upload_status='uploading', upload_attempts=attempt)
+                try:
+                    resource = self.backend.upload(path, field)
+                except Exception as e:
+                    logger.warning('Upload %s thất bại (lần %d): %s', path, attempt, e)
+                    if attempt == self.max_attempts:
+                        if tracked:
+                            save_fields(model, pk, upload_status='failed', upload_error=str(e)[:1000])
+                        return False
+                    time.sleep(self.retry_delay * 2 ** (attempt - 1))
+                    continue
+
+                updates = {field_name: resource}
+                if field_name in images.IMAGE_URL_FIELDS:
+                    updates.update(images.url_updates(field_name, resource))
+                if tracked:
+                    updates.update(upload_status='done', upload_error=None)
+                save_fields(model, pk, **updates)
+                os.remove(path)
+                return True
+        finally:
+            with self._lock:
+                self._active.discard(path)
+            if self.executor is not None:
+                close_old_connections()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                backend = import_string(get_setting('BACKEND', 'courses.uploads.CloudinaryUploadBackend'))()
+                _queue = UploadQueue(backend, get_setting('WORKERS', 2), get_setting('MAX_ATTEMPTS', 3),
+                                     get_setting('RETRY_DELAY', 1))
+    return _queue
+
+
+def set_queue(queue):
+    global _queue
+    _queue = queue
+
+
+def enqueue_upload(instance, field_name, uploaded_file):
+    # Ghi file ra đĩa rồi đưa vào hàng đợi sau khi transaction commit
+    path = spool_file(instance, field_name, uploaded_file)
+    if hasattr(instance, 'upload_status'):
+        instance.upload_status, instance.upload_attempts, instance.upload_error = 'pending', 0, None
+        instance.save(update_fields=['upload_status', 'upload_attempts', 'upload_error'])
+    transaction.on_commit(lambda: get_queue().submit(path))
+    return path
+
+
+def pending_spool_files():
+    directory = spool_dir()
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if not name.endswith('.part'))
@@ -1,6 +1,6 @@
 from django.urls import path, re_path, include
 from rest_framework import routers
-from . import views
+from . import views, async_views, metrics
 from .admin import admin_site
 
 r = routers.DefaultRouter()
@@ -13,9 +13,19 @@ r.register('packages', views.PackageViewSet, 'packages')
 r.register('feedbacks', views.FeedbackViewSet, 'feedbacks')
 r.register('surveyforms', views.SurveyFormViewSet, 'surveyforms')
 r.register('surveyresponses', views.SurveyResponseViewSet, 'surveyresponses')
+r.register('revenue-rollups', views.RevenueRollupViewSet, 'revenue-rollups')
+r.register('sync', views.SyncViewSet, 'sync')
+r.register('search', views.SearchViewSet, 'search')
 
 
 urlpatterns = [
     path('', include(r.urls)),
+    path('events/packages/', views.package_events, name='package-events'),
+    path('metrics', metrics.metrics_view, name='metrics'),
+    path('async/packages/', async_views.package_list, name='async-packages-list'),
+    path('async/packages/<int:pk>/', async_views.package_detail, name='async-packages-detail'),
+    path('async/payments/', async_views.payment_list, name='async-payments-list'),
+    path('async/payments/<int:pk>/', async_views.payment_detail, name='async-payments-detail'),
+    path('async/tudos/', async_views.tudo_list, name='async-tudos-list'),
     path('admin/', admin_site.urls)
 ]
\ No newline at end of file
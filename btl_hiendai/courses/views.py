@@ -1,16 +1,31 @@
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.core.files.uploadedfile import UploadedFile
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection, transaction
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from rest_framework import viewsets, generics, parsers, permissions, status
+from rest_framework.exceptions import ValidationError, APIException
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
 
-from . import serializers, paginators, perms
+from . import serializers, paginators, perms, exports, cache, conditional, sync, notifications, uploads, search
+from .conditional import ConditionalListMixin, ConditionalRetrieveMixin
+from .fastserializers import FastListMixin
+from .fieldsets import SparseFieldsetMixin, requested_fields, select_keys
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from .models import User, Service, ResidentFamily, Feedback, Bill, SurveyForm, SurveyResponse, TuDo, Package, \
-    SurveyQuestion, Payment
+    SurveyQuestion, Payment, RevenueRollup
 from .serializers import PackageSerializer, ResidentFamilySerializer
+from .surveys import record_answers, survey_results
 
 
-class UserViewSet(viewsets.ViewSet, generics.ListAPIView, generics.CreateAPIView):
+class UserViewSet(SparseFieldsetMixin, viewsets.ViewSet, generics.ListAPIView, generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = serializers.UserSerializer
     parser_classes = [parsers.MultiPartParser, ]
@@ -59,31 +74,66 @@ class UserViewSet(viewsets.ViewSet, generics.ListAPIView, generics.CreateAPIView
         return Response(serializers.UserSerializer(instance).data)
 
 
-class ServiceViewSet(viewsets.ViewSet, generics.ListAPIView):
+class ServiceViewSet(SparseFieldsetMixin, viewsets.ViewSet, generics.ListAPIView):
     queryset = Service.objects.all()
     serializer_class = serializers.ServiceSerializer
 
+    def list(self, request, *args, **kwargs):
+        # cache lưu bản đầy đủ, ?fields=/?exclude= lọc trên dữ liệu đã cache
+        data = cache.service_catalog(lambda: list(serializers.ServiceSerializer(self.get_queryset(), many=True).data))
+        return Response(select_keys(data, *requested_fields(request)))
+
+    @action(methods=['get'], url_path='cache-stats', detail=False, permission_classes=[permissions.IsAdminUser])
+    def cache_stats(self, request):
+        return Response(cache.stats())
+
 
-class BillViewSet(viewsets.ViewSet, generics.ListAPIView):
-    queryset = Bill.objects.all()
+class BillViewSet(SparseFieldsetMixin, viewsets.ViewSet, generics.ListAPIView):
+    queryset = Bill.objects.prefetch_related('service').all()
     serializer_class = serializers.BillSerializer
-    pagination_class = paginators.PaymentPaginator
+    pagination_class = paginators.BillPaginator
 
     @action(methods=['get'], url_path='services', detail=True)
     def get_services(self, request, pk=None):
-        services = self.get_object().service.filter(active=True)
-        serializer = serializers.ServiceSerializer(services, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
-
-
-class PaymentViewSet(viewsets.ViewSet, generics.ListAPIView, generics.RetrieveAPIView):
-    queryset = Payment.objects.filter(active=True)
+        def build():
+            services = self.get_object().service.filter(active=True)
+            return list(serializers.ServiceSerializer(services, many=True).data)
+
+        if not str(pk).isdigit():
+            return Response(build(), status=status.HTTP_200_OK)
+        return Response(cache.bill_services(int(pk), build), status=status.HTTP_200_OK)
+
+    @action(methods=['get'], url_path='export', detail=False, permission_classes=[permissions.IsAdminUser])
+    def export(self, request):
+        output = request.query_params.get('type', 'csv')
+        if output not in ('csv', 'ndjson'):
+            return Response({'error': 'type phải là csv hoặc ndjson.'}, status=status.HTTP_400_BAD_REQUEST)
+        return exports.export_response('bills', output, request=request)
+
+
+class PaymentViewSet(SparseFieldsetMixin, ConditionalListMixin, ConditionalRetrieveMixin, FastListMixin,
+                     viewsets.ViewSet, generics.ListAPIView, generics.RetrieveAPIView):
+    etag_resources = ('payment',)
+    queryset = Payment.objects.filter(active=True).select_related('bill', 'user')
     serializer_class = serializers.PaymentSerializer
     pagination_class = paginators.PaymentPaginator
     permission_classes = [perms.PaymentOwner]
+    sparse_keep_fields = ('user',)
 
     def get_queryset(self):
         queryset = self.queryset
+        user = self.request.user
+        # Lọc theo chủ sở hữu ngay trong câu SQL; admin xem được tất cả (có thể lọc ?user=)
+        if not user.is_authenticated:
+            return queryset.none()
+        if user.is_superuser:
+            user_id = self.request.query_params.get('user')
+            if user_id:
+                if not user_id.isdigit():
+                    raise ValidationError({'user': 'user phải là số nguyên.'})
+                queryset = queryset.filter(user=user_id)
+        else:
+            queryset = queryset.filter(user=user)
         q = self.request.query_params.get('status')
         if q:
             queryset = queryset.filter(status=q)
@@ -95,39 +145,120 @@ class PaymentViewSet(viewsets.ViewSet, generics.ListAPIView, generics.RetrieveAP
         payment_image = request.data.get('payment_image')
 
         if payment_image:
-            payment.payment_image = payment_image
             payment.status = 'pass'
-            payment.save()
+            if isinstance(payment_image, UploadedFile):
+                # Ảnh được tải lên Cloudinary ở worker nền, theo dõi qua upload_status
+                with transaction.atomic():
+                    payment.save()
+                    uploads.enqueue_upload(payment, 'payment_image', payment_image)
+            else:
+                payment.payment_image = payment_image
+                payment.save()
             return Response(serializers.PaymentSerializer(payment).data)
         else:
             return Response({'error': 'Không tìm thấy hình ảnh thanh toán.'}, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(methods=['get'], url_path='export', detail=False, permission_classes=[permissions.IsAdminUser])
+    def export(self, request):
+        output = request.query_params.get('type', 'csv')
+        if output not in ('csv', 'ndjson'):
+            return Response({'error': 'type phải là csv hoặc ndjson.'}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = Payment.objects.all()
+        q = request.query_params.get('status')
+        if q:
+            queryset = queryset.filter(status=q)
+        return exports.export_response('payments', output, queryset, request)
+
+
+def bulk_create_packages(packages):
+    if connection.features.can_return_rows_from_bulk_insert:
+        return Package.objects.bulk_create(packages)
+
+    # MySQL không trả về id sau bulk_create: ghi tạm tên "<mã lô>:<vị trí>" để lấy lại đúng các dòng
+    # của lô này (dòng chưa commit nên request khác không thấy), gán id rồi trả lại tên thật
+    last_pk = Package.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    batch = uuid.uuid4().hex
+    names = [p.name for p in packages]
+    for i, package in enumerate(packages):
+        package.name = f'{batch}:{i}'
+    Package.objects.bulk_create(packages)
+
+    pks = dict(Package.objects.filter(pk__gt=last_pk, name__startswith=f'{batch}:').values_list('name', 'pk'))
+    for i, (package, name) in enumerate(zip(packages, names)):
+        package.pk, package.name = pks[f'{batch}:{i}'], name
+    Package.objects.bulk_update(packages, ['name'])
+    return packages
+
 
-class TuDoViewSet(viewsets.ViewSet, generics.ListAPIView):
+class TuDoViewSet(SparseFieldsetMixin, ConditionalListMixin, FastListMixin, viewsets.ViewSet, generics.ListAPIView):
+    etag_resources = ('tudo',)
     queryset = TuDo.objects.all()
     serializer_class = serializers.TuDoSerializer
     pagination_class = paginators.TuDoPaginator
 
+    bulk_limit = 1000
+
     def get_permissions(self):
-        if self.action == 'add_package':
+        if self.action in ['add_package', 'bulk_add_packages', 'bulk_change_package_status']:
             return [permissions.IsAdminUser()]
         return [permissions.AllowAny()]
 
     @action(methods=['get', 'post'], url_path='packages', detail=True)
     def get_packages(self, request, pk):
-        if request.method == 'get':
+        if request.method == 'GET':
             packages = self.get_object().package.filter(status='received')
             return Response(serializers.PackageSerializer(packages, many=True).data, status=status.HTTP_200_OK)
-        elif request.method == 'post':
+        elif request.method == 'POST':
             c = self.get_object().package.create(name=request.data.get('name'))
             return Response(serializers.PackageSerializer(c).data, status=status.HTTP_201_CREATED)
 
+    @action(methods=['post'], url_path='bulk-packages', detail=False)
+    def bulk_add_packages(self, request):
+        items = request.data.get('packages') if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Cần danh sách món hàng (packages).'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.bulk_limit:
+            return Response({'error': f'Tối đa {self.bulk_limit} món hàng mỗi lần.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # Kiểm tra toàn bộ dữ liệu trong một lượt, tủ đồ chỉ tra một câu truy vấn
+        item_serializer = serializers.PackageBulkItemSerializer()
+        results, valid = [], []
+        for i, item in enumerate(items):
+            try:
+                valid.append((i, item_serializer.run_validation(item)))
+                results.append(None)
+            except ValidationError as e:
+                results.append({'index': i, 'created': False, 'errors': e.detail})
+
+        tudo_ids = set(TuDo.objects.filter(pk__in={d['tuDo'] for _, d in valid}).values_list('pk', flat=True))
+        packages = []
+        for i, data in valid:
+            if data['tuDo'] not in tudo_ids:
+                results[i] = {'index': i, 'created': False, 'errors': {'tuDo': ['Ko tìm thấy tủ đồ']}}
+            else:
+                packages.append((i, Package(tuDo_id=data['tuDo'], name=data['name'])))
+
+        with transaction.atomic():
+            created = [p for _, p in packages]
+            if created:
+                bulk_create_packages(created)
+                conditional.bump('package')
+                sync.record_changes('package', created)
+                search.index_objects('package', created)
+                transaction.on_commit(lambda: notifications.notify_packages('package_created', created))
+        for i, package in packages:
+            results[i] = {'index': i, 'created': True, 'package': serializers.PackageSerializer(package).data}
+
+        return Response({'created': len(packages), 'failed': len(items) - len(packages), 'results': results},
+                        status=status.HTTP_201_CREATED if packages else status.HTTP_400_BAD_REQUEST)
+
     @action(methods=['delete'], url_path='delete-package/(?P<package_id>[^/.]+)', detail=True)
     def delete_package(self, request, pk=None, package_id=None):
         try:
             tuDo = get_object_or_404(TuDo, pk=pk)
             package = get_object_or_404(Package, pk=package_id)
-            if package.tuDo != tuDo:
+            if package.tuDo_id != tuDo.pk:
                 return Response({"Ko thấy món hàng"}, status=status.HTTP_400_BAD_REQUEST)
             package.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
@@ -147,7 +278,7 @@ class TuDoViewSet(viewsets.ViewSet, generics.ListAPIView):
         package = get_object_or_404(Package, pk=package_id)
 
         # Kiểm tra món hàng có trong tủ đồ kh
-        if package.tuDo != tuDo:
+        if package.tuDo_id != tuDo.pk:
             return Response({"error": "Place does not belong to this Trip."},
                             status=status.HTTP_400_BAD_REQUEST)
         # Cập nhật package
@@ -156,6 +287,29 @@ class TuDoViewSet(viewsets.ViewSet, generics.ListAPIView):
         package.save()
         return Response(serializers.PackageSerializer(package).data, status=status.HTTP_200_OK)
 
+    @action(methods=['patch'], url_path='packages/status-update', detail=True)
+    def bulk_change_package_status(self, request, pk=None):
+        serializer = serializers.PackageStatusBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['ids']
+        new_status = serializer.validated_data['status']
+        from_status = serializer.validated_data['from_status']
+        # get_object() của DRF trả 404 cho pk không phải số
+        tudo = self.get_object()
+
+        # Một câu UPDATE có điều kiện: chỉ đổi các món hàng thuộc tủ đồ này và đang ở trạng thái from_status
+        with transaction.atomic():
+            packages = Package.objects.filter(tuDo_id=tudo.pk, id__in=ids, status=from_status)
+            changed = list(packages.select_for_update().values_list('id', flat=True))
+            if changed:
+                packages.update(status=new_status, update_date=timezone.localdate())
+                conditional.bump('package')
+                sync.record_changes('package', [Package(pk=package_id, tuDo_id=tudo.pk) for package_id in changed])
+        if changed and new_status == 'received':
+            notifications.notify_packages('package_received', Package.objects.filter(id__in=changed))
+
+        return Response({'changed': changed, 'unchanged': sorted(set(ids) - set(changed))}, status=status.HTTP_200_OK)
+
     # def create(self, request, *args, **kwargs):
     #     name = request.data.get('name')
     #     user_id = request.data.get('user')
@@ -163,7 +317,9 @@ class TuDoViewSet(viewsets.ViewSet, generics.ListAPIView):
     #     return Response(status=status.HTTP_201_CREATED)
 
 
-class PackageViewSet(viewsets.ViewSet, generics.ListAPIView, generics.RetrieveAPIView):
+class PackageViewSet(SparseFieldsetMixin, ConditionalListMixin, ConditionalRetrieveMixin, FastListMixin,
+                     viewsets.ViewSet, generics.ListAPIView, generics.RetrieveAPIView):
+    etag_resources = ('package',)
     queryset = Package.objects.filter(active=True)
     serializer_class = serializers.PackageSerializer
     pagination_class = paginators.PackagePaginator
@@ -173,13 +329,15 @@ class PackageViewSet(viewsets.ViewSet, generics.ListAPIView, generics.RetrieveAP
         q = self.request.query_params.get('q')
         tudo_id = self.request.query_params.get('tuDo')
         if q:
-            queryset = queryset.filter(name__icontains=q)
+            # Dùng chỉ mục tìm kiếm (search.py) thay cho name__icontains (LIKE '%q%' không dùng được index)
+            queryset = queryset.filter(pk__in=search.matching_ids('package', q))
         if tudo_id:
             queryset = queryset.filter(tuDo=tudo_id)
         return queryset
 
 
-class FeedbackViewSet(viewsets.ViewSet, generics.ListAPIView, generics.CreateAPIView):
+class FeedbackViewSet(SparseFieldsetMixin, FastListMixin, viewsets.ViewSet, generics.ListAPIView,
+                      generics.CreateAPIView):
     queryset = Feedback.objects.all()
     serializer_class = serializers.FeedbackSerializer
 
@@ -189,25 +347,168 @@ class FeedbackViewSet(viewsets.ViewSet, generics.ListAPIView, generics.CreateAPI
         return [permissions.AllowAny()]
 
 
-class SurveyFormViewSet(viewsets.ViewSet, generics.RetrieveAPIView):
+class SurveyFormViewSet(SparseFieldsetMixin, viewsets.ViewSet, generics.RetrieveAPIView):
     queryset = SurveyForm.objects.all()
     serializer_class = serializers.SurveyFormSerializer
 
     @action(methods=['post'], detail=True, url_path='add-question-with-answers')
     def add_question_with_answers(self, request, pk=None):
         survey_form = self.get_object()
-        question_text = request.data.get('text')
-        answers = request.data.get('answers')
+        data = request.data if isinstance(request.data, dict) else {}
+        question_text = data.get('text')
+        answers = data.get('answers')
 
         if not question_text or not answers:
             return Response({'error': 'Cả nội dung câu hỏi và câu trả lời đều được yêu cầu.'},
                             status=status.HTTP_400_BAD_REQUEST)
-        question = SurveyQuestion.objects.create(surveyForm=survey_form, text=question_text)
-        for answer in answers:
-            SurveyResponse.objects.create(surveyForm=survey_form, surveyQuestion=question, answer=answer['text'])
+        serializer = serializers.SurveyQuestionWithAnswersSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        question, = self.create_questions(survey_form, [serializer.validated_data])
         return Response(serializers.SurveyQuestionSerializer(question).data, status=status.HTTP_201_CREATED)
 
-
-class SurveyResponseViewSet(viewsets.ViewSet, generics.ListAPIView):
+    @action(methods=['post'], detail=True, url_path='add-questions-with-answers')
+    def add_questions_with_answers(self, request, pk=None):
+        survey_form = self.get_object()
+        serializer = serializers.SurveyQuestionsWithAnswersSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        questions = self.create_questions(survey_form, serializer.validated_data['questions'])
+        return Response(serializers.SurveyQuestionSerializer(questions, many=True).data, status=status.HTTP_201_CREATED)
+
+    @staticmethod
+    def create_questions(survey_form, questions):
+        # Mỗi câu hỏi một INSERT (cần id), toàn bộ câu trả lời gộp vào một bulk_create, tất cả trong một transaction
+        created, responses = [], []
+        with transaction.atomic():
+            for data in questions:
+                question = SurveyQuestion.objects.create(surveyForm=survey_form, text=data['text'])
+                created.append(question)
+                responses.extend(SurveyResponse(surveyForm=survey_form, surveyQuestion=question, answer=answer['text'])
+                                 for answer in data['answers'])
+            SurveyResponse.objects.bulk_create(responses, batch_size=1000)
+            # bulk_create không gửi signal nên cập nhật bộ đếm trực tiếp
+            record_answers(responses)
+        return created
+
+    @action(methods=['get'], detail=True, url_path='results')
+    def get_results(self, request, pk=None):
+        return Response(survey_results(self.get_object()), status=status.HTTP_200_OK)
+
+
+class SurveyResponseViewSet(SparseFieldsetMixin, FastListMixin, viewsets.ViewSet, generics.ListAPIView):
     queryset = SurveyResponse.objects.all()
     serializer_class = serializers.SurveyResponseSerializer
+
+    def get_queryset(self):
+        queryset = self.queryset
+        form_id = self.request.query_params.get('surveyForm')
+        question_id = self.request.query_params.get('surveyQuestion')
+        if form_id:
+            queryset = queryset.filter(surveyForm=form_id)
+        if question_id:
+            queryset = queryset.filter(surveyQuestion=question_id)
+        return queryset
+
+
+class SyncViewSet(viewsets.ViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = min(int(request.query_params.get('limit', sync.SYNC_LIMIT)), sync.SYNC_MAX_LIMIT)
+        except ValueError:
+            return Response({'error': 'since và limit phải là số nguyên.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(sync.changes_since(request.user, since, max(limit, 1)), status=status.HTTP_200_OK)
+
+
+class SearchViewSet(viewsets.ViewSet):
+    # /search/?q=...&type=package,feedback,service: kết quả của các loại, xếp theo điểm
+    resources = {
+        'package': (PackageViewSet.queryset, serializers.PackageSerializer),
+        'feedback': (FeedbackViewSet.queryset, serializers.FeedbackSerializer),
+        'service': (ServiceViewSet.queryset, serializers.ServiceSerializer),
+    }
+    default_limit = 20
+    max_limit = 100
+
+    def list(self, request):
+        q = request.query_params.get('q', '')
+        if not search.query_terms(q):
+            return Response({'error': 'Cần từ khóa tìm kiếm (q).'}, status=status.HTTP_400_BAD_REQUEST)
+        types = request.query_params.get('type')
+        types = [t for t in types.split(',') if t in self.resources] if types else list(self.resources)
+        try:
+            limit = min(max(int(request.query_params.get('limit', self.default_limit)), 1), self.max_limit)
+        except ValueError:
+            return Response({'error': 'limit phải là số nguyên.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Lấy dư một ít vì object đã ẩn (active=False) bị loại khi đọc lại
+        hits = list(search.ranked(types, q)[:limit * 2])
+        objects = {}
+        for resource in {hit['resource'] for hit in hits}:
+            queryset, serializer_class = self.resources[resource]
+            ids = [hit['object_id'] for hit in hits if hit['resource'] == resource]
+            for obj in queryset.filter(pk__in=ids):
+                objects[resource, obj.pk] = serializer_class(obj).data
+
+        results = [{'type': hit['resource'], 'id': hit['object_id'], 'score': hit['score'],
+                    'object': objects[hit['resource'], hit['object_id']]}
+                   for hit in hits if (hit['resource'], hit['object_id']) in objects][:limit]
+        return Response({'q': q, 'results': results}, status=status.HTTP_200_OK)
+
+
+class RevenueRollupViewSet(SparseFieldsetMixin, FastListMixin, viewsets.ViewSet, generics.ListAPIView):
+    queryset = RevenueRollup.objects.all().order_by('month', 'service_id', 'payment_method')
+    serializer_class = serializers.RevenueRollupSerializer
+    permission_classes = [permissions.IsAdminUser]
+
+    def get_queryset(self):
+        queryset = self.queryset
+        year = self.request.query_params.get('year')
+        service_id = self.request.query_params.get('service')
+        payment_method = self.request.query_params.get('payment_method')
+        if year:
+            if not year.isdigit():
+                raise ValidationError({'year': 'year phải là số nguyên.'})
+            queryset = queryset.filter(month__year=year)
+        if service_id:
+            if not service_id.isdigit():
+                raise ValidationError({'service': 'service phải là số nguyên.'})
+            queryset = queryset.filter(service=service_id)
+        if payment_method:
+            queryset = queryset.filter(payment_method=payment_method)
+        return queryset
+
+
+def authenticate_request(request):
+    # Xác thực giống REST API (OAuth2 token), nếu không có thì dùng session.
+    # Lấy user của session trước vì DRF ghi đè request.user khi xác thực thất bại.
+    session_user = getattr(request, 'user', None)
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        user = drf_request.user
+    except APIException:
+        return None
+    if not user.is_authenticated and session_user is not None and session_user.is_authenticated:
+        user = session_user
+    return user if user.is_authenticated else None
+
+
+async def package_events(request):
+    # SSE: thông báo khi có món hàng mới hoặc món hàng chuyển sang "received" trong tủ đồ của người dùng.
+    # Chỉ chạy được qua btl_hiendai.asgi.application.
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'Endpoint này cần chạy qua ASGI.'}, status=status.HTTP_501_NOT_IMPLEMENTED)
+    user = await sync_to_async(authenticate_request)(request)
+    if user is None:
+        return JsonResponse({'error': 'Chưa đăng nhập.'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    tudo_id = user.tuDo_id
+    if user.is_superuser and request.GET.get('tuDo'):
+        tudo_id = request.GET['tuDo']
+    if not tudo_id:
+        return JsonResponse({'error': 'Người dùng chưa có tủ đồ.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    stream = notifications.event_stream(notifications.get_broker(), notifications.tudo_channel(tudo_id))
+    return StreamingHttpResponse(stream, content_type='text/event-stream',
+                                 headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})